@@ -5,6 +5,7 @@ import time
 from typing import TYPE_CHECKING, Any, Type
 
 import nebula
+from dispatch.schema_check import SchemaCheck
 from dispatch.service_monitor import ServiceMonitor
 from dispatch.storage_monitor import StorageMonitor
 
@@ -24,6 +25,7 @@ class NebulaDispatch:
     agent_list: dict[str, Type["BaseAgent"]] = {
         "storage-monitor": StorageMonitor,
         "service-monitor": ServiceMonitor,
+        "schema-check": SchemaCheck,
         #        "system-monitor": SystemMonitor,
     }
 
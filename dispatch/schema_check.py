@@ -0,0 +1,15 @@
+from dispatch.agents import BaseAgent
+from nebula.schema import check_schema
+
+
+class SchemaCheck(BaseAgent):
+    """Create worker database indexes and check the hot query plans.
+
+    Runs once, after the dispatch starts.
+    """
+
+    def main(self) -> None:
+        try:
+            check_schema()
+        finally:
+            self.should_run = False
@@ -6,7 +6,7 @@ from typing import Any
 import nebula
 from dispatch.agents import BaseAgent
 from nebula.settings.models import StorageSettings
-from nebula.storages import Storage
+from nebula.storages import Storage, storage_status
 
 
 def exec_mount(cmd: str) -> bool:
@@ -78,6 +78,7 @@ class StorageMonitor(BaseAgent):
         db = nebula.DB()
         db.query("SELECT id, settings FROM storages")
         status: dict[str, Any] = {}
+        mounted: dict[int, bool] = {}
 
         for id_storage, storage_settings in db.fetchall():
             storage = Storage(
@@ -96,7 +97,10 @@ class StorageMonitor(BaseAgent):
             )
 
             if storage.is_mounted:
+                mounted[id_storage] = True
                 continue
+            # picked up by the next check if mounted below
+            mounted[id_storage] = False
 
             if storage.protocol == "local":
                 if not os.path.isdir(storage.path):
@@ -117,3 +121,6 @@ class StorageMonitor(BaseAgent):
                 "last_mount_attempt": storage.last_mount_attempt,
                 "mount_attempts": storage.mount_attempts,
             }
+
+        # Shared with other processes, so they don't check the storages
+        storage_status.publish(mounted)
@@ -1,11 +1,18 @@
+import json
+import os
 import sys
 import time
+from typing import Any
 from xml.etree.ElementTree import Element
 
-from nebula.db import DB
+from nebula.config import config
+from nebula.db import DB, pool_stats
 from nebula.enum import ServiceState
 from nebula.log import log
 
+# Seconds between connection pool statistics log lines
+POOL_STATS_INTERVAL = 300
+
 
 class BaseService:
     id_service: int
@@ -14,6 +21,8 @@ class BaseService:
     def __init__(self, id_service, settings: Element | None = None):
         log.debug(f"Initializing service ID {id_service}")
         self.id_service = id_service
+        self.pool_stats = pool_stats()
+        self.pool_stats_logged: float = 0
         if settings is not None:
             self.settings = settings
 
@@ -37,6 +46,32 @@ class BaseService:
     def id(self) -> int:
         return self.id_service
 
+    @property
+    def state_path(self) -> str:
+        return os.path.join(config.data_dir, f"service_{self.id_service}.json")
+
+    def load_state(self) -> dict[str, Any]:
+        """Load the service state persisted using save_state()"""
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception:
+            log.traceback("Unable to load service state")
+            return {}
+
+    def save_state(self, data: dict[str, Any]) -> None:
+        """Persist the service state across service restarts"""
+        temp_path = f"{self.state_path}.tmp"
+        try:
+            os.makedirs(config.data_dir, exist_ok=True)
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.state_path)
+        except Exception:
+            log.traceback("Unable to save service state")
+
     def on_init(self):
         pass
 
@@ -79,5 +114,25 @@ class BaseService:
             )
             db.commit()
 
+        self.log_pool_stats()
+
         if state in [ServiceState.STOPPED, ServiceState.STOPPING, ServiceState.KILL]:
             self.shutdown()
+
+    def log_pool_stats(self) -> None:
+        """Log database connection pool statistics.
+
+        Overflows (pool exhaustion) are reported as soon as they happen,
+        the full statistics every POOL_STATS_INTERVAL seconds.
+        """
+        stats = pool_stats()
+        overflows = stats["overflows"] - self.pool_stats["overflows"]
+        if overflows > 0:
+            log.warning(
+                f"{overflows} overflow database connections opened. "
+                f"Consider increasing postgres_pool_size (now {stats['size']})"
+            )
+        if time.time() - self.pool_stats_logged > POOL_STATS_INTERVAL:
+            log.debug("Database pool:", ", ".join(f"{k}={v}" for k, v in stats.items()))
+            self.pool_stats_logged = time.time()
+        self.pool_stats = stats
@@ -18,11 +18,58 @@ class NebulaConfig(BaseModel):
         description="PostgreSQL connection string",
     )
 
+    postgres_pool_size: int = Field(
+        8,
+        description="Number of PostgreSQL connections kept by each process",
+    )
+
+    postgres_pool_timeout: float = Field(
+        1,
+        description="Seconds to wait for a free pooled connection "
+        "before opening an overflow connection",
+    )
+
+    postgres_pool_max_idle: float = Field(
+        300,
+        description="Seconds after which an idle pooled connection is closed",
+    )
+
+    postgres_fetch_size: int = Field(
+        1000,
+        description="Number of rows fetched at once when iterating over "
+        "large query results using server-side cursors",
+    )
+
     redis: RedisDsn = Field(
         "redis://redis",
         description="Redis connection string",
     )
 
+    messaging_batch_size: int = Field(
+        100,
+        description="Maximum number of messages published in one Redis pipeline",
+    )
+
+    messaging_batch_latency: float = Field(
+        0,
+        description="Seconds to wait for more messages before publishing a batch",
+    )
+
+    messaging_queue_size: int = Field(
+        10000,
+        description="Maximum number of messages waiting to be published",
+    )
+
+    messaging_drop_policy: Literal["oldest", "newest"] = Field(
+        "oldest",
+        description="Which messages are dropped when the message queue is full",
+    )
+
+    object_cache_size: int = Field(
+        0,
+        description="Number of objects cached by each process (0 to disable)",
+    )
+
     frontend_dir: str = Field(
         "/frontend",
         description="Path to the frontend directory",
@@ -43,6 +90,17 @@ class NebulaConfig(BaseModel):
         description="Path to the nebula root directory",
     )
 
+    data_dir: str = Field(
+        "/var/lib/nebula",
+        description="Path to the directory for persistent local state",
+    )
+
+    probe_cache_size: int = Field(
+        100000,
+        description="Number of mediaprobe results cached in the data directory "
+        "(0 to disable)",
+    )
+
     log_level: Literal[
         "trace", "debug", "info", "success", "warning", "error", "critical"
     ] = Field(
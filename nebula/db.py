@@ -1,21 +1,62 @@
+import itertools
+import os
+import threading
 import time
+from collections.abc import Generator
 from typing import Any
 from urllib.parse import urlparse
 
 import psycopg2
+import psycopg2.extras
+from psycopg2.extensions import connection as Connection
 
 from nebula.config import config
 from nebula.log import log
+from nebula.serialization import json_loads
 
 NEBULA_IS_INSTALLED: bool = False
 
+# Parse json and jsonb columns (object metadata, job settings)
+# using the same codec which is used to serialize them.
+psycopg2.extras.register_default_json(globally=True, loads=json_loads)
+psycopg2.extras.register_default_jsonb(globally=True, loads=json_loads)
 
-class DB:
-    def __init__(self) -> None:
-        result = urlparse(config.postgres)
-        global NEBULA_IS_INSTALLED
+# Pooled connections idle for longer than this are checked
+# using a trivial query before they are handed out again.
+HEALTH_CHECK_INTERVAL = 10
+
+
+class ConnectionPool:
+    """Process-wide pool of PostgreSQL connections.
+
+    Connections are handed out exclusively (one DB object - one connection)
+    and returned when the DB object is closed or garbage collected.
 
-        conn_dict = {
+    When all `size` connections are in use, getconn waits up to `timeout`
+    seconds for one to be returned. If none is returned in time, an overflow
+    connection is opened, so code holding several DB objects in one thread
+    never deadlocks. Overflow connections are closed when returned.
+    """
+
+    def __init__(self, size: int, timeout: float, max_idle: float) -> None:
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self.lock = threading.Condition()
+        self.idle: list[tuple[Connection, float]] = []
+        self.in_use = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.overflows = 0
+        self.created = 0
+        self.discarded = 0
+
+    @property
+    def conn_dict(self) -> dict[str, Any]:
+        result = urlparse(config.postgres)
+        return {
             "user": result.username,
             "password": result.password,
             "host": result.hostname,
@@ -23,15 +64,153 @@ class DB:
             "database": result.path[1:],
         }
 
+    def _connect(self) -> Connection:
         while True:
             try:
-                self.conn = psycopg2.connect(**conn_dict)
+                conn = psycopg2.connect(**self.conn_dict)
             except psycopg2.OperationalError:
                 log.warning("Unable to connect to database, retrying in 1 second...")
                 time.sleep(1)
                 continue
-            break
+            with self.lock:
+                self.created += 1
+            return conn
+
+    def _discard(self, conn: Connection) -> None:
+        with self.lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _validate(self, conn: Connection, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.time() - last_used < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _check_pid(self) -> None:
+        """Forget connections inherited from the parent process.
+
+        Must be called with the lock held. Inherited connections are not
+        closed, because that would terminate the parent's sessions.
+        """
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.idle = []
+            self.in_use = 0
+
+    def getconn(self) -> Connection:
+        stale: list[Connection] = []
+        conn: Connection | None = None
+        last_used: float = 0
+
+        with self.lock:
+            self._check_pid()
+            self.checkouts += 1
+
+            now = time.time()
+            while self.idle and now - self.idle[0][1] > self.max_idle:
+                stale.append(self.idle.pop(0)[0])
+
+            if not self.idle and self.in_use >= self.size:
+                self.waits += 1
+                if not self.lock.wait_for(
+                    lambda: self.idle or self.in_use < self.size,
+                    timeout=self.timeout,
+                ):
+                    self.overflows += 1
+                    log.warning(
+                        f"Database connection pool exhausted ({self.in_use} in use)."
+                        " Opening an overflow connection"
+                    )
+
+            if self.idle:
+                conn, last_used = self.idle.pop()
+            self.in_use += 1
+
+        for stale_conn in stale:
+            self._discard(stale_conn)
+
+        try:
+            if conn is not None and not self._validate(conn, last_used):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            with self.lock:
+                self.in_use -= 1
+                self.lock.notify()
+            raise
+        return conn
+
+    def putconn(self, conn: Connection) -> None:
+        keep = not conn.closed
+        if keep:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                keep = False
 
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Connection belongs to another process. Just drop it.
+                return
+            self.in_use = max(0, self.in_use - 1)
+            self.lock.notify()
+            if keep and len(self.idle) < self.size:
+                self.idle.append((conn, time.time()))
+                return
+
+        self._discard(conn)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "size": self.size,
+                "open": self.in_use + len(self.idle),
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "overflows": self.overflows,
+                "created": self.created,
+                "discarded": self.discarded,
+            }
+
+
+pool = ConnectionPool(
+    size=config.postgres_pool_size,
+    timeout=config.postgres_pool_timeout,
+    max_idle=config.postgres_pool_max_idle,
+)
+
+
+# Names of server-side cursors must be unique within a connection
+_cursor_ids = itertools.count(1)
+
+
+def pool_stats() -> dict[str, int]:
+    """Return connection pool counters for monitoring"""
+    return pool.stats()
+
+
+class DB:
+    conn: Connection | None = None
+
+    def __init__(self) -> None:
+        global NEBULA_IS_INSTALLED
+
+        self.conn = pool.getconn()
         self.cur = self.conn.cursor()
 
         if not NEBULA_IS_INSTALLED:
@@ -62,6 +241,51 @@ class DB:
     def query(self, query: str, *args: Any) -> None:
         self.cur.execute(query, *args)
 
+    def iterate(
+        self,
+        query: str,
+        *args: Any,
+        batch_size: int | None = None,
+    ) -> Generator[tuple[Any, ...], None, None]:
+        """Iterate over the results of a query using a server-side cursor.
+
+        Rows are fetched in batches of `batch_size` (postgres_fetch_size
+        by default), so memory usage does not depend on the number
+        of rows. The cursor is closed when the transaction ends:
+        do not commit using this DB object while iterating and save
+        changes using another one.
+        """
+        assert self.conn is not None, "Database connection is closed"
+        cur = self.conn.cursor(name=f"nebula_iterate_{next(_cursor_ids)}")
+        cur.itersize = batch_size or config.postgres_fetch_size
+        try:
+            cur.execute(query, *args)
+            yield from cur
+        finally:
+            try:
+                cur.close()
+            except psycopg2.Error:
+                # the transaction has already ended
+                pass
+
+    def execute_values(
+        self,
+        query: str,
+        rows: list[Any],
+        page_size: int = 500,
+    ) -> None:
+        """Execute a query with a single VALUES %s placeholder for many rows"""
+        psycopg2.extras.execute_values(self.cur, query, rows, page_size=page_size)
+
+    def execute_batch(
+        self,
+        query: str,
+        rows: list[Any],
+        page_size: int = 500,
+    ) -> None:
+        """Execute a query for many argument rows in few round trips"""
+        psycopg2.extras.execute_batch(self.cur, query, rows, page_size=page_size)
+
     def fetchone(self):
         return self.cur.fetchone()
 
@@ -69,13 +293,38 @@ class DB:
         return self.cur.fetchall()
 
     def commit(self) -> None:
+        assert self.conn is not None, "Database connection is closed"
         self.conn.commit()
 
     def rollback(self) -> None:
+        assert self.conn is not None, "Database connection is closed"
         self.conn.rollback()
 
     def close(self) -> None:
-        self.conn.close()
+        """Return the connection to the pool.
+
+        Uncommitted changes are rolled back.
+        """
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        try:
+            self.cur.close()
+        except Exception:
+            pass
+        pool.putconn(conn)
+
+    def __enter__(self) -> "DB":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def __bool__(self) -> bool:
         return True
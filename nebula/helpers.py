@@ -54,9 +54,16 @@ def asset_by_full_path(path: str, db: DB | None = None) -> Asset | None:
 
 
 def meta_exists(key: str, value: Any, db: DB | None = None) -> Asset | None:
+    """Return the first asset with the given metadata value (compared as text)
+
+    Keys used as import identifiers are indexed (see nebula.schema).
+    """
     if db is None:
         db = DB()
-    db.query("SELECT meta FROM assets WHERE meta->>%s = %s", [str(key), str(value)])
+    db.query(
+        "SELECT meta FROM assets WHERE meta->>%s = %s LIMIT 1",
+        [str(key), str(value)],
+    )
     for (meta,) in db.fetchall():
         return Asset(meta=meta, db=db)
     return None
@@ -1,5 +1,5 @@
-import json
 import time
+from types import CodeType
 from typing import Any
 
 from nxtools import xml
@@ -8,7 +8,8 @@ from nebula.db import DB
 from nebula.enum import ContentType, JobState, MediaType, ObjectStatus
 from nebula.log import log
 from nebula.messaging import messaging
-from nebula.objects import Asset
+from nebula.objects import Asset, AssetView
+from nebula.serialization import json_dumps
 
 _ = ObjectStatus, ContentType, MediaType, JobState
 
@@ -21,6 +22,7 @@ class Action:
         self.id = id_action
         self.title = title
         self.settings = settings
+        self._compiled: dict[str, CodeType] = {}
         try:
             create_if = settings.findall("create_if")[0]
         except IndexError:
@@ -54,26 +56,84 @@ class Action:
                 else:
                     self.skip_if = None
 
+        #
+        # Limit max running jobs
+        #
+        # This is used for example for playout jobs - multiple
+        # running jobs at once may cause storage performance issues
+        # and dropped frames
+        #
+
+        try:
+            self.max_jobs = int(settings.attrib.get("max_jobs", 0))
+        except ValueError:
+            self.max_jobs = 0
+
+        #
+        # Limit using run_on whitelist
+        #
+        # This is used to allow action to run only on specific services
+        # (for example, only on services running on hosts with specific hardware)
+        #
+        # Usage:
+        # Add `run_on` tag to action settings with comma-separated list of
+        # service IDs. For example:
+        #
+        # <run_on>1,2,3</run_on>
+        #
+
+        self.run_on: list[int] = []
+        for run_on_tag in settings.findall("run_on"):
+            try:
+                value = [int(r.strip()) for r in run_on_tag.text.split(",")]
+            except (ValueError, AttributeError):
+                log.error(f"Invalid run_on value for action {title}: {run_on_tag.text}")
+                continue
+            self.run_on.extend(value)
+
+        self.pre_scripts: list[str] = [
+            pre.text for pre in settings.findall("pre") if pre.text
+        ]
+
+    @property
+    def has_conditions(self) -> bool:
+        """Whether the action needs an asset to decide if a job may start"""
+        return bool(self.start_if or self.skip_if or self.pre_scripts)
+
+    def runs_on(self, id_service: int) -> bool:
+        return not self.run_on or id_service in self.run_on
+
     @property
     def created_key(self):
         return f"job_created/{self.id}"
 
-    def should_create(self, asset: Asset):
-        _ = asset
+    def _evaluate(self, condition: str, asset: Asset | AssetView) -> Any:
+        """Evaluate a condition expression against the given asset.
+
+        Expressions are compiled on the first use and the code objects
+        are cached by their source, so changing `create_if`, `start_if`
+        or `skip_if` invalidates the cached code automatically.
+        """
+        try:
+            code = self._compiled[condition]
+        except KeyError:
+            code = compile(condition, f"<action {self.id} condition>", "eval")
+            self._compiled[condition] = code
+        return eval(code, globals(), {"self": self, "asset": asset})
+
+    def should_create(self, asset: Asset | AssetView):
         if self.create_if:
-            return eval(self.create_if)
+            return self._evaluate(self.create_if, asset)
         return False
 
-    def should_start(self, asset: Asset):
-        _ = asset
+    def should_start(self, asset: Asset | AssetView):
         if self.start_if:
-            return eval(self.start_if)
+            return self._evaluate(self.start_if, asset)
         return True
 
-    def should_skip(self, asset: Asset):
-        _ = asset
+    def should_skip(self, asset: Asset | AssetView):
         if self.skip_if:
-            return eval(self.skip_if)
+            return self._evaluate(self.skip_if, asset)
         return False
 
 
@@ -210,41 +270,81 @@ class Job:
                 status=1,
                 progress=0
             WHERE id=%s AND id_service IS NULL
+            RETURNING id
             """,
             [id_service, now, self.id],
         )
+        taken = bool(self.db.fetchall())
         self.db.commit()
-        self.db.query(
-            "SELECT id FROM jobs WHERE id=%s AND id_service=%s", [self.id, id_service]
-        )
-        if self.db.fetchall():
-            messaging.send(
-                "job_progress",
-                id=self.id,
-                id_asset=self.id_asset,
-                id_action=self.id_action,
-                stime=now,
-                status=1,
-                progress=0,
-                message="Starting...",
-            )
+        if taken:
+            self._started(id_service, now)
             return True
         return False
 
+    def start(self, id_service: int) -> bool:
+        """Start a pending job, which is unassigned or assigned to the service.
+
+        Returns False if the job is not pending (or assigned to another
+        service), in which case it is left untouched.
+        """
+        now = time.time()
+        self.db.query(
+            """
+            UPDATE jobs SET
+                id_service=%s,
+                start_time=%s,
+                end_time=NULL,
+                status=1,
+                progress=0
+            WHERE id=%s
+                AND (id_service IS NULL OR id_service=%s)
+                AND status IN (0, 5)
+            RETURNING id
+            """,
+            [id_service, now, self.id, id_service],
+        )
+        started = bool(self.db.fetchall())
+        self.db.commit()
+        if started:
+            self._started(id_service, now)
+        return started
+
+    def _started(self, id_service: int, start_time: float) -> None:
+        self.id_service = id_service
+        self.status = JobState.IN_PROGRESS
+        messaging.send(
+            "job_progress",
+            id=self.id,
+            id_asset=self.id_asset,
+            id_action=self.id_action,
+            stime=start_time,
+            status=1,
+            progress=0,
+            message="Starting...",
+        )
+
     def set_progress(self, progress, message="In progress"):
+        """Store the progress of a running job.
+
+        Jobs which are no longer running (finished, aborted, restarted)
+        are not updated, so a late progress report can't revive them.
+        """
         db = DB()
         progress = round(progress, 2)
         db.query(
             """
             UPDATE jobs SET
-                status=1,
                 progress=%s,
                 message=%s
-            WHERE id=%s
+            WHERE id=%s AND status=1
+            RETURNING id
             """,
             [progress, message, self.id],
         )
+        updated = bool(db.fetchall())
         db.commit()
+        if not updated:
+            return
         messaging.send(
             "job_progress",
             id=self.id,
@@ -381,159 +481,346 @@ class Job:
         )
 
 
+class ProgressReporter:
+    """Rate-limited job progress updates.
+
+    Encoders report progress several times per second, but writing each
+    update to the database (and checking whether the job was aborted)
+    is wasteful. The reporter stores the latest progress and writes it
+    only when at least `min_interval` seconds passed since the previous
+    write and the progress moved by at least `min_delta` percent
+    (or the stage changed). Job status is polled every
+    `status_interval` seconds.
+
+    The stage identifies the kind of message ("Encoding", "Importing")
+    and defaults to the message itself. Messages of the same stage
+    which differ only in volatile values (percentage, speed) don't
+    force a write.
+
+    Call flush() when the task finishes, to store the final state,
+    or close() when the job was stopped, to ignore further updates.
+    """
+
+    def __init__(
+        self,
+        job: Job,
+        min_interval: float = 5,
+        min_delta: float = 0.5,
+        status_interval: float = 5,
+    ) -> None:
+        self.job = job
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.status_interval = status_interval
+
+        self.progress: float = 0
+        self.message: str | None = None
+        self.dirty = False
+        self.last_write: float = 0
+        self.last_written_progress: float | None = None
+        self.stage: str | None = None
+        self.last_written_stage: str | None = None
+        self.last_status_check = time.monotonic()
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        self.dirty = False
+
+    def update(
+        self,
+        progress: float,
+        message: str = "In progress",
+        stage: str | None = None,
+    ) -> None:
+        if self.closed:
+            return
+        self.progress = progress
+        self.message = message
+        self.stage = stage or message
+        self.dirty = True
+
+        if time.monotonic() - self.last_write < self.min_interval:
+            return
+        if (
+            self.last_written_progress is not None
+            and abs(progress - self.last_written_progress) < self.min_delta
+            and self.stage == self.last_written_stage
+        ):
+            return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the latest reported progress, if it was not written yet"""
+        if not self.dirty:
+            return
+        assert self.message is not None
+        self.job.set_progress(self.progress, self.message)
+        self.dirty = False
+        self.last_write = time.monotonic()
+        self.last_written_progress = self.progress
+        self.last_written_stage = self.stage
+
+    def poll_status(self) -> JobState | None:
+        """Return the current job state from the database,
+        or None if it was checked less than `status_interval` seconds ago.
+        """
+        now = time.monotonic()
+        if now - self.last_status_check < self.status_interval:
+            return None
+        self.last_status_check = now
+        return self.job.get_status()
+
+
+#
+# Job claiming
+#
+# Candidate jobs are locked using SELECT ... FOR UPDATE SKIP LOCKED,
+# so concurrent workers polling the same queue never wait for each other
+# and never claim the same job. max_jobs limits are evaluated in the same
+# query, run_on whitelists are applied to the list of actions beforehand.
+#
+# SKIP LOCKED does not protect max_jobs limits: the running jobs are
+# counted under READ COMMITTED, so two workers could both see a free slot.
+# Claims of limited actions are serialized using transaction-level
+# advisory locks, taken before the jobs are counted.
+#
+
+CLAIM_BATCH_SIZE = 20
+
+# Candidates with conditions are examined in at most this many batches
+# per get_job call.
+MAX_CLAIM_BATCHES = 5
+
+# Jobs left waiting (start_if not met) are not examined again for this many
+# seconds, so the following get_job calls reach lower ranked candidates
+# instead of re-checking the same top ones.
+WAITING_RECHECK_INTERVAL = 30
+
+# id_job: time the job was left waiting
+_waiting_jobs: dict[int, float] = {}
+
+# First key of advisory locks serializing claims (the second is id_action)
+CLAIM_LOCK_KEY = 0x4E4A  # "NJ"
+
+CANDIDATE_JOBS_QUERY = """
+    SELECT {columns}
+    FROM jobs AS j
+    JOIN assets AS a ON a.id = j.id_asset
+    LEFT JOIN (
+        SELECT
+            unnest(%(limited_actions)s::integer[]) AS id_action,
+            unnest(%(limits)s::integer[]) AS max_jobs
+    ) AS l ON l.id_action = j.id_action
+    WHERE
+        j.status IN (0, 3, 5)
+        AND j.id_action = ANY(%(action_ids)s::integer[])
+        AND j.id_service IS NULL
+        AND j.retries < %(max_retries)s
+        AND NOT j.id = ANY(%(seen)s::integer[])
+        AND (
+            l.max_jobs IS NULL
+            OR l.max_jobs > (
+                SELECT COUNT(*) FROM jobs AS r
+                WHERE r.status = 1 AND r.id_action = j.id_action
+            )
+        )
+    ORDER BY j.priority DESC, j.creation_time DESC
+    LIMIT %(limit)s
+    FOR UPDATE OF j SKIP LOCKED
+"""
+
+
+def _lock_limited_actions(params: dict[str, Any], db: DB) -> None:
+    """Lock actions with max_jobs limits until the end of the transaction"""
+    # always in the same order, so concurrent claims can't deadlock
+    for id_action in sorted(params["limited_actions"]):
+        db.query("SELECT pg_advisory_xact_lock(%s, %s)", [CLAIM_LOCK_KEY, id_action])
+
+
+def _recently_waiting() -> list[int]:
+    """Return IDs of jobs left waiting less than WAITING_RECHECK_INTERVAL ago"""
+    now = time.time()
+    for id_job, checked_at in list(_waiting_jobs.items()):
+        if now - checked_at > WAITING_RECHECK_INTERVAL:
+            del _waiting_jobs[id_job]
+    return list(_waiting_jobs)
+
+
+def _claim_job(id_service: int, params: dict[str, Any], db: DB) -> Job | None:
+    """Claim the top eligible job in a single statement.
+
+    Used when none of the actions has start/skip conditions,
+    so the job may be taken without looking at the asset first.
+    """
+    now = time.time()
+    candidate = CANDIDATE_JOBS_QUERY.format(columns="j.id")
+    _lock_limited_actions(params, db)
+    db.query(
+        f"""
+        UPDATE jobs SET
+            id_service=%(id_service)s,
+            start_time=%(now)s,
+            end_time=NULL,
+            status=1,
+            progress=0
+        FROM assets
+        WHERE assets.id = jobs.id_asset AND jobs.id = ({candidate})
+        RETURNING
+            jobs.id,
+            jobs.id_action,
+            jobs.id_user,
+            jobs.settings,
+            jobs.priority,
+            jobs.retries,
+            assets.meta
+        """,
+        {**params, "id_service": id_service, "now": now, "limit": 1},
+    )
+    row = db.fetchone()
+    db.commit()
+    if row is None:
+        return None
+
+    id_job, id_action, id_user, settings, priority, retries, meta = row
+    job = Job(id_job, db=db)
+    job._asset = Asset(meta=meta, db=db)
+    job._action = actions[id_action]
+    job._settings = settings
+    job.priority = priority
+    job.retries = retries
+    job.id_user = id_user
+    job._started(id_service, now)
+    return job
+
+
 def get_job(id_service: int, action_ids: list[int], db: DB | None = None):
     assert isinstance(action_ids, list), "action_ids must be list of integers"
     if not action_ids:
         return False
     if db is None:
         db = DB()
-    now = time.time()
-
-    running_jobs_count = {}
-    db.query(
-        """
-        SELECT id_action, COUNT(id)
-        FROM jobs
-        WHERE status=1
-        GROUP by id_action
-        """
-    )
-    for id_action, cnt in db.fetchall():
-        running_jobs_count[id_action] = cnt
 
-    q = """
-        SELECT
-            id,
-            id_action,
-            id_asset,
-            id_user,
-            settings,
-            priority,
-            retries,
-            status
-        FROM jobs
-        WHERE
-            status IN (0,3,5)
-            AND id_action IN %s
-            AND id_service IS NULL
-            AND retries < %s
-            ORDER BY priority DESC, creation_time DESC
-        """
-    db.query(q, [tuple(action_ids), MAX_RETRIES])
-
-    for (
-        id_job,
-        id_action,
-        id_asset,
-        id_user,
-        settings,
-        priority,
-        retries,
-        status,
-    ) in db.fetchall():
-        asset = Asset(id_asset, db=db)
+    eligible_actions: list[Action] = []
+    for id_action in action_ids:
         action = actions[id_action]
-        job = Job(id_job, db=db)
-        job._asset = asset
-        job._settings = settings
-        job.priority = priority
-        job.retries = retries
-        job.id_user = id_user
+        if not action:
+            log.warning(f"Unable to get job. No such action ID {id_action}")
+            continue
+        if not action.runs_on(id_service):
+            continue
+        eligible_actions.append(action)
 
-        #
-        # Limit max running jobs
-        #
-        # This is used for example for playout jobs - multiple
-        # running jobs at once may cause storage performance issues
-        # and dropped frames
-        #
+    if not eligible_actions:
+        return False
 
-        max_running_jobs = action.settings.attrib.get("max_jobs", 0)
-        try:
-            max_running_jobs = int(max_running_jobs)
-        except ValueError:
-            max_running_jobs = 0
-        if max_running_jobs:
-            running_jobs = running_jobs_count.get(id_action, 0)
-            if running_jobs >= max_running_jobs:
-                continue  # Maximum allowed jobs already running. skip
+    limited_actions = [action for action in eligible_actions if action.max_jobs]
+    params: dict[str, Any] = {
+        "action_ids": [action.id for action in eligible_actions],
+        "limited_actions": [action.id for action in limited_actions],
+        "limits": [action.max_jobs for action in limited_actions],
+        "max_retries": MAX_RETRIES,
+        "seen": [],
+    }
 
-        #
-        # Limit using run_on whitelist
-        #
-        # This is used to allow action to run only on specific services
-        # (for example, only on services running on hosts with specific hardware)
-        #
-        # Usage:
-        # Add `run_on` tag to action settings with comma-separated list of
-        # service IDs. For example:
-        #
-        # <run_on>1,2,3</run_on>
-        #
+    if not any(action.has_conditions for action in eligible_actions):
+        return _claim_job(id_service, params, db) or False
 
-        run_on_services: list[int] = []
-        for run_on_tag in action.settings.findall("run_on"):
-            try:
-                value = [int(r.strip()) for r in run_on_tag.text.split(",")]
-            except ValueError:
-                log.error(
-                    f"Invalid run_on value for action {action}: {run_on_tag.text}"
-                )
-                continue
-            run_on_services.extend(value)
+    #
+    # Some of the actions have conditions, which need to be evaluated
+    # in Python. Lock candidates in batches and take the first one
+    # which passes. Locks are released by the commit at the end of each batch.
+    #
 
-        if run_on_services and (id_service not in run_on_services):
-            continue
+    params["seen"] = _recently_waiting()
+
+    candidates_query = CANDIDATE_JOBS_QUERY.format(
+        columns="""
+            j.id,
+            j.id_action,
+            j.id_user,
+            j.settings,
+            j.priority,
+            j.retries,
+            j.status,
+            a.meta
+        """
+    )
 
-        #
-        # Pre-script filtering
-        #
+    for _ in range(MAX_CLAIM_BATCHES):
+        now = time.time()
+        _lock_limited_actions(params, db)
+        db.query(candidates_query, {**params, "limit": CLAIM_BATCH_SIZE})
+        rows = db.fetchall()
 
-        for pre in action.settings.findall("pre"):
-            if pre.text:
+        for (
+            id_job,
+            id_action,
+            id_user,
+            settings,
+            priority,
+            retries,
+            status,
+            meta,
+        ) in rows:
+            params["seen"].append(id_job)
+            asset = Asset(meta=meta, db=db)
+            action = actions[id_action]
+            job = Job(id_job, db=db)
+            job._asset = asset
+            job._action = action
+            job._settings = settings
+            job.priority = priority
+            job.retries = retries
+            job.id_user = id_user
+
+            #
+            # Pre-script filtering
+            #
+
+            for pre in action.pre_scripts:
                 try:
-                    exec(pre.text)
+                    exec(pre)
                 except Exception:
                     log.traceback()
                     continue
-        if not action:
-            log.warning(f"Unable to get job. No such action ID {id_action}")
-            continue
 
-        if status != 5 and action.should_skip(asset):
-            log.info(f"Skipping {job}")
-            db.query(
-                """
-                UPDATE jobs SET
-                    status=6,
-                    message='Skipped',
-                    start_time=%s,
-                    end_time=%s
-                WHERE id=%s
-                """,
-                [now, now, id_job],
-            )
-            db.commit()
-            continue
+            if status != 5 and action.should_skip(asset):
+                log.info(f"Skipping {job}")
+                db.query(
+                    """
+                    UPDATE jobs SET
+                        status=6,
+                        message='Skipped',
+                        start_time=%s,
+                        end_time=%s
+                    WHERE id=%s
+                    """,
+                    [now, now, id_job],
+                )
+                continue
 
-        if action.should_start(asset):
-            if job.take(id_service):
-                return job
-            else:
+            if action.should_start(asset):
+                if job.take(id_service):
+                    return job
                 log.warning(f"Unable to take {job}")
                 continue
-        else:
+
+            _waiting_jobs[id_job] = now
             db.query("UPDATE jobs SET message='Waiting' WHERE id=%s", [id_job])
             messaging.send(
                 "job_progress",
                 id=id_job,
-                id_asset=id_asset,
+                id_asset=asset.id,
                 id_action=id_action,
                 status=status,
                 progress=0,
                 message="Waiting",
             )
-            db.commit()
+
+        db.commit()
+        if len(rows) < CLAIM_BATCH_SIZE:
+            break
     return False
 
 
@@ -562,7 +849,7 @@ def send_to(
         FROM jobs
         WHERE id_asset=%s AND id_action=%s AND settings=%s
         """,
-        [id_asset, id_action, json.dumps(settings)],
+        [id_asset, id_action, json_dumps(settings)],
     )
     res = db.fetchall()
     if res:
@@ -637,7 +924,7 @@ def send_to(
             id_action,
             id_user,
             id_service,
-            json.dumps(settings),
+            json_dumps(settings),
             priority,
             time.time(),
         ],
@@ -4,6 +4,8 @@ from typing import Any
 from nxtools import tc2s
 from nxtools.media import ffprobe
 
+from nebula.probe_cache import file_key, probe_cache
+
 
 class AudioTrack(dict):
     @property
@@ -91,11 +93,28 @@ def noop(x: Any) -> Any:
     return x
 
 
-def mediaprobe(source_file: str) -> dict[str, Any]:
+def mediaprobe(source_file: str, use_cache: bool = True) -> dict[str, Any]:
+    """Return technical metadata of a media file.
+
+    Results are cached (see nebula.probe_cache) until the file changes.
+    Returns an empty dict if the file does not exist or can't be probed.
+    """
     source_file = str(source_file)
-    if not os.path.exists(source_file):
+    try:
+        key = file_key(os.stat(source_file))
+    except OSError:
         return {}
 
+    if use_cache and (meta := probe_cache.get(source_file, key)) is not None:
+        return meta
+
+    meta = _mediaprobe(source_file)
+    if use_cache and meta:
+        probe_cache.put(source_file, key, meta)
+    return meta
+
+
+def _mediaprobe(source_file: str) -> dict[str, Any]:
     probe_result = ffprobe(source_file)
     if not probe_result:
         return {}
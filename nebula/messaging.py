@@ -1,28 +1,166 @@
-import json
-import queue
+import atexit
+import itertools
 import socket
 import threading
 import time
-from typing import Any
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Literal
 
 import redis
 
 from nebula.config import config
 from nebula.log import log
+from nebula.serialization import json_dumps, json_loads
 
 HOSTNAME = socket.gethostname()
 
+QueuedMessage = tuple[float, str, dict[str, Any]]
+
+
+class MessageQueue:
+    """Bounded FIFO of outgoing messages.
+
+    Messages may be queued with a coalescing key. When a message with
+    the same key is still waiting to be sent, it is updated in place
+    with the new data instead of queueing another message.
+
+    When the queue is full, either the oldest queued message or the new
+    message is dropped, depending on `drop_policy`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        drop_policy: Literal["oldest", "newest"] = "oldest",
+    ) -> None:
+        self.maxsize = max(1, maxsize)
+        self.drop_policy = drop_policy
+        self.messages: OrderedDict[Hashable, QueuedMessage] = OrderedDict()
+        self.cond = threading.Condition()
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        self.overflowing = False
+
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def put(self, message: QueuedMessage, key: Hashable | None = None) -> None:
+        started_dropping = False
+        with self.cond:
+            self.queued += 1
+            if key is not None and key in self.messages:
+                _, method, data = self.messages[key]
+                self.messages[key] = (message[0], method, {**data, **message[2]})
+                self.coalesced += 1
+                return
+
+            accept = True
+            if len(self.messages) >= self.maxsize:
+                self.dropped += 1
+                started_dropping = not self.overflowing
+                self.overflowing = True
+                if self.drop_policy == "oldest":
+                    self.messages.popitem(last=False)
+                else:
+                    accept = False
+
+            if accept:
+                if key is None:
+                    key = next(self.sequence)
+                self.messages[key] = message
+                self.cond.notify()
+
+        if started_dropping:
+            # Outside the lock: logging queues a message as well
+            log.warning(
+                f"Message queue is full. Dropping {self.drop_policy} messages",
+                handlers=None,
+            )
+
+    def get_batch(self, size: int, latency: float = 0) -> list[QueuedMessage]:
+        """Block until a message is available and return up to `size`
+        queued messages. If latency is set, wait up to that many seconds
+        for the batch to fill up.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.messages)
+            if latency > 0:
+                deadline = time.monotonic() + latency
+                while len(self.messages) < size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+
+            batch: list[QueuedMessage] = []
+            while self.messages and len(batch) < size:
+                batch.append(self.messages.popitem(last=False)[1])
+            self.in_flight = len(batch)
+            if len(self.messages) < self.maxsize // 2:
+                self.overflowing = False
+            return batch
+
+    def count_dropped(self, count: int) -> None:
+        """Count messages which were taken from the queue but not sent"""
+        with self.cond:
+            self.dropped += count
+
+    def batch_done(self) -> None:
+        with self.cond:
+            self.in_flight = 0
+            self.cond.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait until all queued messages are sent"""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: not (self.messages or self.in_flight),
+                timeout=timeout,
+            )
+
+    def stats(self) -> dict[str, int]:
+        with self.cond:
+            return {
+                "pending": len(self.messages),
+                "queued": self.queued,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+            }
+
 
 class Messaging:
+    # Topics carrying state snapshots, where only the latest value matters.
+    # Maps a topic to the message field identifying the object the snapshot
+    # describes. Newer unsent messages are merged into the older ones.
+    coalesce_keys: dict[str, str] = {
+        "job_progress": "id",
+        "playout_status": "id_channel",
+        "service_state": "id",
+    }
+
     def __init__(self):
         self.connection = None
         self.channel = None
-        self.queue: queue.Queue[Any] = queue.Queue()
+        self.queue = MessageQueue(
+            config.messaging_queue_size,
+            drop_policy=config.messaging_drop_policy,
+        )
+        self.batch_size = max(1, config.messaging_batch_size)
+        self.batch_latency = config.messaging_batch_latency
 
         self.main_loop = threading.Thread(target=self.send_thread)
         self.main_loop.daemon = True
         self.main_loop.start()
 
+        self.handlers: dict[str, list[Callable[[dict[str, Any]], None]]] = {}
+        self.reset_handlers: list[Callable[[], None]] = []
+        self.listener: threading.Thread | None = None
+
     def connect(self):
         self.channel = f"nebula-{config.site_name}"
         log.debug(f"Connecting messaging to {config.redis}", handlers=None)
@@ -40,42 +178,128 @@ class Messaging:
 
     def send_thread(self):
         while True:
-            if self.queue.empty():
-                time.sleep(0.01)
-                continue
-            qm, qd = self.queue.get()
-            self.send(qm, **qd)
+            batch = self.queue.get_batch(self.batch_size, self.batch_latency)
+            try:
+                self.publish(batch)
+            finally:
+                self.queue.batch_done()
 
     def __call__(self, method, **data):
-        self.queue.put([method, data])
+        key = None
+        if (key_field := self.coalesce_keys.get(method)) and key_field in data:
+            key = (method, data[key_field])
+        self.queue.put((time.time(), method, data), key=key)
 
     def send(self, method, **data):
+        """Queue a message to be published by the sender thread"""
+        self(method, **data)
+
+    def publish(self, batch: list[QueuedMessage]) -> None:
+        """Publish a batch of messages using a single Redis pipeline"""
         if not (self.connection and self.channel):
             if not self.connect():
+                self.queue.count_dropped(len(batch))
                 time.sleep(0.1)
                 return
 
         assert self.connection and self.channel
 
-        message = json.dumps(
-            [
-                time.time(),
-                config.site_name,
-                HOSTNAME,
-                method,
-                data,
-            ]
-        )
+        pipeline = self.connection.pipeline(transaction=False)
+        for timestamp, method, data in batch:
+            try:
+                message = json_dumps(
+                    [
+                        timestamp,
+                        config.site_name,
+                        HOSTNAME,
+                        method,
+                        data,
+                    ]
+                )
+            except Exception:
+                log.traceback(f"Unable to serialize {method} message", handlers=None)
+                self.queue.count_dropped(1)
+                continue
+            pipeline.publish(self.channel, message)
+
+        # Failed batches are not requeued: a part of the pipeline
+        # may have been published already.
+        count = len(pipeline)
         try:
-            self.connection.publish(self.channel, message)
+            pipeline.execute()
         except redis.exceptions.ConnectionError:
             log.error("Unable to connect Redis to send a message.", handlers=None)
+            self.queue.count_dropped(count)
             time.sleep(1)
             self.connect()
         except Exception:
             log.traceback(handlers=None)
+            self.queue.count_dropped(count)
             self.connect()
 
+    def subscribe(
+        self,
+        method: str,
+        handler: Callable[[dict[str, Any]], None],
+        on_reset: Callable[[], None] | None = None,
+    ) -> None:
+        """Call handler(data) for each `method` message published by any
+        Nebula process (including this one).
+
+        on_reset is called whenever the listener (re)connects to Redis,
+        because messages published while it was disconnected are lost.
+
+        The listener thread is started by the first subscription.
+        """
+        self.handlers.setdefault(method, []).append(handler)
+        if on_reset is not None:
+            self.reset_handlers.append(on_reset)
+        if self.listener is None:
+            self.listener = threading.Thread(target=self.listen_thread, daemon=True)
+            self.listener.start()
+
+    def listen_thread(self):
+        channel = f"nebula-{config.site_name}"
+        while True:
+            try:
+                connection = redis.from_url(
+                    config.redis,
+                    decode_responses=True,
+                    socket_connect_timeout=3,
+                    health_check_interval=30,
+                )
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                for handler in self.reset_handlers:
+                    handler()
+                for message in pubsub.listen():
+                    self.dispatch(message["data"])
+            except Exception:
+                log.traceback("Message listener failed", handlers=None)
+            time.sleep(1)
+
+    def dispatch(self, payload: str | bytes) -> None:
+        try:
+            _, site_name, _, method, data = json_loads(payload)
+        except Exception:
+            return
+        if site_name != config.site_name:
+            return
+        for handler in self.handlers.get(method, []):
+            try:
+                handler(data)
+            except Exception:
+                log.traceback(f"Unable to handle {method} message", handlers=None)
+
+    def flush(self, timeout: float = 2) -> None:
+        """Wait until queued messages are published"""
+        self.queue.join(timeout)
+
+    def stats(self) -> dict[str, int]:
+        """Return message queue counters for monitoring"""
+        return self.queue.stats()
+
 
 messaging = Messaging()
 log.messaging = messaging
+atexit.register(messaging.flush)
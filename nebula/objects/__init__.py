@@ -1,6 +1,16 @@
-__all__ = ["Asset", "Item", "Bin", "Event", "User", "anonymous"]
+__all__ = [
+    "Asset",
+    "AssetView",
+    "Item",
+    "Bin",
+    "Event",
+    "User",
+    "anonymous",
+    "save_many",
+]
 
-from nebula.objects.asset import Asset
+from nebula.objects.asset import Asset, AssetView
+from nebula.objects.base import save_many
 from nebula.objects.bin import Bin
 from nebula.objects.event import Event
 from nebula.objects.item import Item
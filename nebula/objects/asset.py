@@ -1,12 +1,25 @@
 import os
+from typing import Any
 
 from nebula.config import config
+from nebula.db import DB
 from nebula.enum import ContentType, MediaType
 from nebula.objects.base import BaseObject, object_helper
 from nebula.settings import settings
 from nebula.storages import storages
 
 
+def asset_file_path(media_type: Any, id_storage: Any, path: Any) -> str:
+    """Return the full path to an asset file or an empty string"""
+    if media_type != MediaType.FILE:
+        return ""
+    try:
+        storage_path = storages[int(id_storage)].local_path
+        return os.path.join(storage_path, path)
+    except (KeyError, IndexError, ValueError):
+        return ""
+
+
 class Asset(BaseObject):
     table_name = "assets"
     db_cols = [
@@ -37,6 +50,10 @@ class Asset(BaseObject):
             self.db.query("DELETE FROM jobs WHERE id_asset = %s", [self.id])
             # db.commit is called by the delete method
 
+    def to_asset(self) -> "Asset":
+        """Return self. Allows using Asset where an AssetView is expected"""
+        return self
+
     #
     # Props
     #
@@ -51,13 +68,7 @@ class Asset(BaseObject):
         in os.path.exists and so on.
         """
 
-        if self["media_type"] != MediaType.FILE:
-            return ""
-        try:
-            storage_path = storages[int(self["id_storage"])].local_path
-            return os.path.join(storage_path, self["path"])
-        except (KeyError, IndexError, ValueError):
-            return ""
+        return asset_file_path(self["media_type"], self["id_storage"], self["path"])
 
     def mark_in(self, new_val: float | None = None) -> float:
         """Get or set mark_in value"""
@@ -166,4 +177,80 @@ class Asset(BaseObject):
         pass
 
 
+class AssetView:
+    """Read-only view of asset metadata for high-volume scans.
+
+    Wraps the metadata dict returned by the database without copying it.
+    Only the most common read-only accessors are implemented. Accessing
+    any other Asset attribute, or calling to_asset(), creates the full
+    Asset object, which should be used for changes and saving.
+    """
+
+    __slots__ = ("meta", "_db", "_asset")
+
+    object_type = "asset"
+
+    def __init__(self, meta: dict[str, Any], db: DB | None = None) -> None:
+        self.meta = meta
+        self._db = db
+        self._asset: Asset | None = None
+
+    def to_asset(self) -> Asset:
+        """Return a full Asset object with a copy of the metadata"""
+        if self._asset is None:
+            if self._db is None:
+                self._asset = Asset(meta=self.meta)
+            else:
+                self._asset = Asset(meta=self.meta, db=self._db)
+        return self._asset
+
+    def __getattr__(self, name: str) -> Any:
+        # Called only for attributes the view does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.to_asset(), name)
+
+    @property
+    def id(self) -> int | None:
+        return self.meta.get("id")
+
+    @property
+    def id_folder(self) -> int | None:
+        return self.meta.get("id_folder")
+
+    def keys(self) -> list[str]:
+        return list(self.meta.keys())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.meta or key in Asset.defaults:
+            return self[key]
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.meta.get(key)
+        if value is None:
+            if key in Asset.defaults:
+                return Asset.defaults[key]
+            if key in settings.metatypes:
+                return settings.metatypes[key].default
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        raise TypeError("AssetView is read-only. Use to_asset() to change it")
+
+    def __repr__(self) -> str:
+        result = f"asset ID:{self.id}"
+        if title := self["title"]:
+            result += f" ({title})"
+        return result
+
+    def __bool__(self) -> bool:
+        return True
+
+    @property
+    def file_path(self) -> str:
+        """Full path to the asset file. See Asset.file_path"""
+        return asset_file_path(self["media_type"], self["id_storage"], self["path"])
+
+
 object_helper["asset"] = Asset
@@ -1,15 +1,20 @@
-import json
+import functools
 import pprint
+import threading
 import time
-from typing import TYPE_CHECKING, Any, Type
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any, Type, TypeVar
 
 from nxtools import slugify
 
+from nebula.config import config
 from nebula.db import DB
 from nebula.log import log
 from nebula.messaging import messaging
 from nebula.metadata.format import format_meta
 from nebula.metadata.normalize import normalize_meta
+from nebula.serialization import json_dumps, json_loads
 from nebula.settings import settings
 
 if TYPE_CHECKING:
@@ -20,13 +25,35 @@ if TYPE_CHECKING:
     from nebula.objects.user import User
 
 
+FT_WORDS_CACHE_SIZE = 10000
+
+# Objects with more than this fraction of their keys changed
+# are saved by writing the whole metadata document.
+PARTIAL_UPDATE_MAX_RATIO = 0.5
+
+
+@functools.lru_cache(maxsize=FT_WORDS_CACHE_SIZE)
+def ft_words(value: str) -> frozenset[str]:
+    """Return the set of full-text index words of a string.
+
+    Results are cached, so values which did not change between saves
+    (title, description...) are not slugified again.
+    """
+    return frozenset(slugify(value, make_set=True, min_length=3))
+
+
+def is_text_key(key: str, value: Any) -> bool:
+    """Return True if the key/value pair is a part of the full-text index"""
+    return key == "subclips" or isinstance(value, str)
+
+
 def create_ft_index(meta):
     ft = {}
     if "subclips" in meta:
         weight = 8
         for sc in [k.get("title", "") for k in meta["subclips"]]:
             try:
-                for word in slugify(sc, make_set=True, min_length=3):
+                for word in ft_words(sc):
                     if word not in ft:
                         ft[word] = weight
                     else:
@@ -45,7 +72,7 @@ def create_ft_index(meta):
         if not weight:
             continue
         try:
-            for word in slugify(meta[key], make_set=True, min_length=3):
+            for word in ft_words(meta[key]):
                 if word not in ft:
                     ft[word] = weight
                 else:
@@ -55,6 +82,120 @@ def create_ft_index(meta):
     return ft
 
 
+CacheEntry = tuple[float, str]  # (monotonic timestamp, serialized meta)
+
+
+class ObjectCache:
+    """Per-process LRU cache of object metadata.
+
+    Objects loaded by ID (BaseObject.load) are served from the cache,
+    so hot objects (such as assets of a rundown in the play service)
+    don't need to be queried again. Entries are keyed by
+    (object_type, id) and evicted when the cache grows over `size`
+    entries or when they are older than `max_age` seconds.
+
+    Entries are invalidated on save and delete, and by `objects_changed`
+    messages published by other processes. Since messages may be lost
+    while Redis is disconnected, the cache is cleared on reconnect.
+
+    Metadata is stored serialized, so each get() returns an independent
+    copy (including nested values such as subclips) which callers may
+    modify freely.
+
+    The cache is disabled unless `size` is set, either using
+    the object_cache_size config option or by calling enable().
+    """
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.max_age: float = 60
+        self.data: OrderedDict[tuple[str, int], CacheEntry] = OrderedDict()
+        self.lock = threading.Lock()
+        self.subscribed = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def enable(self, size: int, max_age: float = 60) -> None:
+        with self.lock:
+            self.size = size
+            self.max_age = max_age
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+        if self.enabled and not self.subscribed:
+            self.subscribed = True
+            messaging.subscribe(
+                "objects_changed",
+                self.on_objects_changed,
+                on_reset=self.clear,
+            )
+
+    def get(self, object_type: str, id: int) -> dict[str, Any] | None:
+        """Return a deep copy of the cached metadata or None"""
+        if not self.enabled:
+            return None
+        key = (object_type, id)
+        with self.lock:
+            try:
+                timestamp, meta = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if time.monotonic() - timestamp > self.max_age:
+                del self.data[key]
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+        return json_loads(meta)
+
+    def put(self, object_type: str, id: int, meta: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        key = (object_type, id)
+        data = json_dumps(meta)
+        with self.lock:
+            self.data[key] = (time.monotonic(), data)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def invalidate(self, object_type: str, id: int) -> None:
+        with self.lock:
+            self.data.pop((object_type, id), None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def on_objects_changed(self, data: dict[str, Any]) -> None:
+        object_type = data.get("object_type")
+        if not object_type:
+            return
+        for id in data.get("objects") or []:
+            self.invalidate(object_type, id)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "size": self.size,
+                "entries": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+object_cache = ObjectCache()
+if config.object_cache_size:
+    object_cache.enable(config.object_cache_size)
+
+
+T = TypeVar("T", bound="BaseObject")
+
+
 class BaseObject:
     """Base object properties."""
 
@@ -70,7 +211,7 @@ class BaseObject:
         if "db" in kwargs:
             self._db = kwargs["db"]
 
-        self.text_changed = self.meta_changed = False
+        self.clear_changes()
         self.is_new = True
         self.meta = {}
         meta = kwargs.get("meta", {})
@@ -95,6 +236,40 @@ class BaseObject:
         for key in self.defaults:
             if key not in self.meta:
                 self.meta[key] = self.defaults[key]
+        if not self.is_new:
+            self.clear_changes()
+
+    @classmethod
+    def load_many(cls: type[T], ids: Iterable[int], db: DB | None = None) -> list[T]:
+        """Load multiple objects using a single query.
+
+        Returns objects in the order of the given IDs.
+        Duplicate IDs are loaded once, non-existent IDs are skipped.
+        """
+        object_type = cls.__name__.lower()
+        ids = list(dict.fromkeys(int(id) for id in ids if id))
+        metas: dict[int, dict[str, Any]] = {}
+        missing: list[int] = []
+        for id in ids:
+            if (meta := object_cache.get(object_type, id)) is not None:
+                metas[id] = meta
+            else:
+                missing.append(id)
+
+        if missing:
+            if db is None:
+                db = DB()
+            db.query(
+                f"SELECT id, meta FROM {cls.table_name} WHERE id = ANY(%s)",
+                [missing],
+            )
+            for id, meta in db.fetchall():
+                metas[id] = meta
+                object_cache.put(object_type, id, meta)
+
+        if db is None:
+            return [cls(meta=metas[id]) for id in ids if id in metas]
+        return [cls(meta=metas[id], db=db) for id in ids if id in metas]
 
     #
     # Database access
@@ -147,16 +322,53 @@ class BaseObject:
             value = normalize_meta(key, value)
         except ValueError as e:
             raise ValueError(f"Invalid value for {key}: {value}") from e
+        old_value = self.meta.get(key)
         if value is None:
             self.meta.pop(key, None)
         else:
             self.meta[key] = value
+        if value != old_value:
+            self._mark_changed(key, deleted=value is None)
+            if is_text_key(key, value) or is_text_key(key, old_value):
+                self.text_changed = True
 
     def __delitem__(self, key: str):
         key = key.lower().strip()
         if key not in self.meta:
             return
-        del self.meta[key]
+        old_value = self.meta.pop(key)
+        self._mark_changed(key, deleted=True)
+        if is_text_key(key, old_value):
+            self.text_changed = True
+
+    #
+    # Change tracking
+    #
+
+    def _mark_changed(self, key: str, deleted: bool = False) -> None:
+        self.meta_changed = True
+        if self.changed_keys is None:
+            return
+        if deleted:
+            self.changed_keys.discard(key)
+            self.deleted_keys.add(key)
+        else:
+            self.deleted_keys.discard(key)
+            self.changed_keys.add(key)
+
+    def clear_changes(self) -> None:
+        """Forget tracked changes (after the object is loaded or saved)"""
+        self.text_changed = self.meta_changed = False
+        self.changed_keys: set[str] | None = set()
+        self.deleted_keys: set[str] = set()
+
+    def require_full_update(self) -> None:
+        """Write the whole metadata document on the next save.
+
+        Use this after modifying the meta dict directly,
+        bypassing change tracking.
+        """
+        self.changed_keys = None
 
     def __repr__(self) -> str:
         if self.id:
@@ -191,7 +403,12 @@ class BaseObject:
     def new(self):
         pass
 
-    def save(self, **kwargs):
+    def prepare_save(self, **kwargs) -> None:
+        """Set timestamps and defaults before the object is saved
+
+        Called by save() and save_many(). Subclasses may extend it
+        to update derived metadata.
+        """
         if not kwargs.get("silent", False):
             log.debug(f"Saving {self}")
         self["ctime"] = self["ctime"] or time.time()
@@ -202,6 +419,9 @@ class BaseObject:
                 self[key] = self.defaults[key]
             assert key in self.meta, f"Unable to save {self}. {key} is required"
 
+    def save(self, **kwargs):
+        self.prepare_save(**kwargs)
+
         is_new = self.is_new
         if is_new:
             self._insert(**kwargs)
@@ -212,15 +432,16 @@ class BaseObject:
             self.update_ft_index(is_new)
         if kwargs.get("commit", True):
             self.db.commit()
-        self.text_changed = self.meta_changed = False
+        self.clear_changes()
         self.is_new = False
+        assert self.id is not None
+        object_cache.invalidate(self.object_type, self.id)
         if kwargs.get("notify", True):
             messaging.send(
                 "objects_changed", objects=[self.id], object_type=self.object_type
             )
 
     def delete(self, **kwargs):
-        _ = kwargs
         if not self.id:
             return
         log.info(f"Deleting {self}")
@@ -231,8 +452,19 @@ class BaseObject:
             [self.object_type_id, self.id],
         )
         self.db.commit()
+        object_cache.invalidate(self.object_type, self.id)
+        # Other processes indexing the object (caches, the watch service
+        # path index) drop it when they fail to load it again
+        if kwargs.get("notify", True):
+            messaging.send(
+                "objects_changed", objects=[self.id], object_type=self.object_type
+            )
 
     def load(self, id):
+        self.clear_changes()
+        if (meta := object_cache.get(self.object_type, id)) is not None:
+            self.meta = meta
+            return
         self.db.query(f"SELECT meta FROM {self.table_name} WHERE id = {id}")
         try:
             self.meta = self.db.fetchall()[0][0]
@@ -242,73 +474,165 @@ class BaseObject:
                 f"ID:{id}. Object does not exist"
             )
             return False
+        object_cache.put(self.object_type, id, self.meta)
 
     def _insert(self, **kwargs):
         _ = kwargs
-        cols: list[str] = []
-        vals: list[Any] = []
-        if self.id:
-            cols.append("id")
-            vals.append(self.id)
-        for col in self.db_cols:
-            cols.append(col)
-            vals.append(self[col])
-        if self.id:
-            cols.append("meta")
-            vals.append(json.dumps(self.meta))
-
-        if cols:
-            query = "INSERT INTO {} ({}) VALUES ({}) RETURNING id".format(
-                self.table_name, ", ".join(cols), ", ".join(["%s"] * len(cols))
+        self._insert_many([self], self.db)
+
+    @classmethod
+    def _insert_many(cls, objects: list["BaseObject"], db: DB) -> None:
+        """Insert new objects.
+
+        IDs of objects which don't have one are reserved from the table
+        sequence beforehand, so the metadata (which contains the ID)
+        is written by the INSERT itself.
+        """
+        without_id = [obj for obj in objects if not obj.id]
+        if without_id:
+            db.query(
+                """
+                SELECT nextval(pg_get_serial_sequence(%s, 'id'))
+                FROM generate_series(1, %s)
+                """,
+                [cls.table_name, len(without_id)],
             )
+            for obj, (new_id,) in zip(without_id, db.fetchall(), strict=True):
+                assert new_id, "Unable to insert new object, database returned no ID"
+                obj["id"] = new_id
+
+        cols = ["id", *cls.db_cols, "meta"]
+        rows = [
+            [obj.id, *[obj[col] for col in cls.db_cols], json_dumps(obj.meta)]
+            for obj in objects
+        ]
+        db.execute_values(
+            f"INSERT INTO {cls.table_name} ({', '.join(cols)}) VALUES %s",
+            rows,
+        )
+
+    def _update_query(self) -> tuple[str, list[Any]]:
+        """Return the UPDATE query and its arguments for the object.
+
+        Only changed metadata keys (and columns) are written if the
+        changes are tracked, otherwise the whole document is.
+        """
+        changed = self.changed_keys
+        deleted = self.deleted_keys
+        if (
+            changed is not None
+            and (changed or deleted)
+            and len(changed) <= len(self.meta) * PARTIAL_UPDATE_MAX_RATIO
+        ):
+            keys = changed | deleted
+            cols = [col for col in self.db_cols if col in keys]
+            sets = ["meta = (meta - %s::text[]) || %s::jsonb"]
+            vals: list[Any] = [
+                sorted(deleted),
+                json_dumps({key: self.meta[key] for key in changed}),
+            ]
         else:
-            query = f"""
-                INSERT INTO {self.table_name}
-                DEFAULT VALUES RETURNING id
-            """
-        self.db.query(query, vals)
+            cols = self.db_cols
+            sets = ["meta=%s"]
+            vals = [json_dumps(self.meta)]
 
-        if not self.id:
-            new_id = self.db.fetchall()[0][0]
-            assert new_id, "Unable to insert new object, database returned no ID"
-            self["id"] = new_id
-            self.db.query(
-                f"UPDATE {self.table_name} SET meta=%s WHERE id=%s",
-                [json.dumps(self.meta), new_id],
-            )
+        for col in cols:
+            sets.append(f"{col}=%s")
+            vals.append(self[col])
+
+        query = f"UPDATE {self.table_name} SET {', '.join(sets)} WHERE id=%s"
+        return query, [*vals, self.id]
+
+    @classmethod
+    def _update_many(cls, objects: list["BaseObject"], db: DB) -> None:
+        batches: dict[str, list[list[Any]]] = {}
+        for obj in objects:
+            assert obj.id, "Unable to update object, no ID"
+            query, args = obj._update_query()
+            batches.setdefault(query, []).append(args)
+        for query, rows in batches.items():
+            if len(rows) == 1:
+                db.query(query, rows[0])
+            else:
+                db.execute_batch(query, rows)
 
     def _update(self, **kwargs):
         _ = kwargs
-        assert self.id, "Unable to update object, no ID"
-        cols: list[str] = ["meta"]
-        vals: list[Any] = [json.dumps(self.meta)]
-
-        for col in self.db_cols:
-            cols.append(col)
-            vals.append(self[col])
-
-        query = "UPDATE {} SET {} WHERE id=%s".format(
-            self.table_name, ", ".join([key + "=%s" for key in cols])
-        )
-        self.db.query(query, vals + [self.id])
+        self._update_many([self], self.db)
 
     def update_ft_index(self, is_new=False):
+        self._update_ft_index_many([self], self.db, is_new=is_new)
+
+    @classmethod
+    def _update_ft_index_many(
+        cls,
+        objects: list["BaseObject"],
+        db: DB,
+        is_new: bool = False,
+    ) -> None:
+        """Update the full-text index of the given objects.
+
+        For existing objects, the index is compared with the stored one
+        and only added and removed words and changed weights are written.
+        """
+        indexes: dict[int, dict[str, int]] = {}
+        for obj in objects:
+            assert obj.id is not None, "Unable to index an unsaved object"
+            indexes[obj.id] = create_ft_index(obj.meta)
+        current: dict[int, dict[str, int]] = {}
         if not is_new:
-            self.db.query(
-                "DELETE FROM ft WHERE object_type=%s AND id=%s",
-                [self.object_type_id, self.id],
+            db.query(
+                """
+                SELECT id, value, weight FROM ft
+                WHERE object_type=%s AND id = ANY(%s)
+                """,
+                [cls.object_type_id, list(indexes)],
+            )
+            for id, word, weight in db.fetchall():
+                current.setdefault(id, {})[word] = weight
+
+        to_insert: list[tuple[int, int, int, str]] = []
+        to_update: list[tuple[int, str, int]] = []
+        to_delete: list[tuple[int, str]] = []
+        for id, index in indexes.items():
+            stored = current.get(id, {})
+            for word, weight in index.items():
+                if word not in stored:
+                    to_insert.append((id, cls.object_type_id, weight, word))
+                elif stored[word] != weight:
+                    to_update.append((id, word, weight))
+            for word in stored:
+                if word not in index:
+                    to_delete.append((id, word))
+
+        # object_type_id is an integer class attribute, so it is safe
+        # to format it in the queries (execute_values accepts only
+        # the VALUES placeholder)
+
+        if to_delete:
+            db.execute_values(
+                f"""
+                DELETE FROM ft USING (VALUES %s) AS d (id, value)
+                WHERE ft.object_type={int(cls.object_type_id)}
+                AND ft.id=d.id AND ft.value=d.value
+                """,
+                to_delete,
+            )
+        if to_update:
+            db.execute_values(
+                f"""
+                UPDATE ft SET weight=d.weight
+                FROM (VALUES %s) AS d (id, value, weight)
+                WHERE ft.object_type={int(cls.object_type_id)}
+                AND ft.id=d.id AND ft.value=d.value
+                """,
+                to_update,
+            )
+        if to_insert:
+            db.execute_values(
+                "INSERT INTO ft (id, object_type, weight, value) VALUES %s",
+                to_insert,
             )
-        ft = create_ft_index(self.meta)
-        if not ft:
-            return
-        args = [(self.id, self.object_type_id, ft[word], word) for word in ft]
-        tpls = ",".join(["%s"] * len(args))
-        self.db.query(
-            f"""
-            INSERT INTO ft (id, object_type, weight, value)
-            VALUES {tpls}""",
-            args,
-        )
 
     #
     # Methods overriden by subclasses
@@ -322,6 +646,59 @@ class BaseObject:
         pass
 
 
+def save_many(objects: Iterable[BaseObject], db: DB | None = None, **kwargs) -> None:
+    """Save multiple objects at once.
+
+    New objects are inserted and existing objects are updated using bulk
+    statements (per object class), the full-text index is updated
+    in bulk as well and all changes are committed at once. A single
+    objects_changed message is sent for each object type.
+
+    Accepts the same keyword arguments as BaseObject.save
+    (set_mtime, notify, commit, silent).
+    """
+    objects = list(objects)
+    if not objects:
+        return
+    if db is None:
+        db = objects[0].db
+
+    by_class: dict[type[BaseObject], list[BaseObject]] = {}
+    for obj in objects:
+        obj.prepare_save(**kwargs)
+        by_class.setdefault(type(obj), []).append(obj)
+
+    for cls, class_objects in by_class.items():
+        new_objects = [obj for obj in class_objects if obj.is_new]
+        changed_objects = [obj for obj in class_objects if not obj.is_new]
+        if new_objects:
+            cls._insert_many(new_objects, db)
+            cls._update_ft_index_many(new_objects, db, is_new=True)
+        if changed_objects:
+            cls._update_many(changed_objects, db)
+            if text_changed := [obj for obj in changed_objects if obj.text_changed]:
+                cls._update_ft_index_many(text_changed, db)
+            for obj in changed_objects:
+                obj.invalidate()
+
+    if kwargs.get("commit", True):
+        db.commit()
+
+    for obj in objects:
+        obj.clear_changes()
+        obj.is_new = False
+        assert obj.id is not None
+        object_cache.invalidate(obj.object_type, obj.id)
+
+    if kwargs.get("notify", True):
+        for class_objects in by_class.values():
+            messaging.send(
+                "objects_changed",
+                objects=[obj.id for obj in class_objects],
+                object_type=class_objects[0].object_type,
+            )
+
+
 class ObjectHelper:
     """
     This class is used to register all object classes,
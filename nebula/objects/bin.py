@@ -17,6 +17,8 @@ class Bin(BaseObject):
     required = ["bin_type"]
     defaults = {"bin_type": 0}
 
+    _items: list["Item"]
+
     @property
     def duration(self) -> float:
         if "duration" not in self.meta:
@@ -29,20 +31,7 @@ class Bin(BaseObject):
     @property
     def items(self) -> list["Item"]:
         if not hasattr(self, "_items"):
-            if not self.id:
-                self._items = []
-            else:
-                self.db.query(
-                    """
-                    SELECT meta FROM items
-                    WHERE id_bin=%s ORDER BY position ASC, id ASC
-                    """,
-                    [self.id],
-                )
-                self._items = [
-                    object_helper.Item(meta=meta, db=self.db)
-                    for (meta,) in self.db.fetchall()
-                ]
+            self.load_items()
         return self._items
 
     @items.setter
@@ -50,6 +39,49 @@ class Bin(BaseObject):
         assert isinstance(value, list)
         self._items = value
 
+    def load_items(self, with_assets: bool = True) -> list["Item"]:
+        """(Re)load items of the bin
+
+        When with_assets is set (default), assets of all items
+        are loaded as well, using a single query.
+        """
+        if not self.id:
+            self._items = []
+            return self._items
+
+        self.db.query(
+            """
+            SELECT meta FROM items
+            WHERE id_bin=%s ORDER BY position ASC, id ASC
+            """,
+            [self.id],
+        )
+        self._items = [
+            object_helper.Item(meta=meta, db=self.db) for (meta,) in self.db.fetchall()
+        ]
+        if with_assets:
+            self.prefetch_assets()
+        return self._items
+
+    def prefetch_assets(self) -> None:
+        """Load assets of all items, which don't have them loaded yet"""
+        items = [
+            item
+            for item in self.items
+            if item.meta.get("id_asset") and not hasattr(item, "_asset")
+        ]
+        if not items:
+            return
+        assets = {
+            asset.id: asset
+            for asset in object_helper.Asset.load_many(
+                [item.meta["id_asset"] for item in items],
+                db=self.db,
+            )
+        }
+        for item in items:
+            item._asset = assets.get(item.meta["id_asset"])
+
     def append(self, item: "Item") -> None:
         assert isinstance(item, object_helper.Item)
         self._items.append(item)
@@ -81,16 +113,17 @@ class Bin(BaseObject):
         This method is used to delete all items in bin.
         It is called from BaseObject.delete() method.
         """
+        if not hasattr(self, "_items"):
+            self.load_items(with_assets=False)
         for item in self.items:
             item.delete()
         self._items = []
 
-    def save(self, **kwargs) -> None:
-        """Save bin and recalculate duration
+    def prepare_save(self, **kwargs) -> None:
+        """Recalculate duration of the bin based on its items
 
-        This is an override of BaseObject.save() method
-        it is needed to recalculate duration of the bin
-        based on its items.
+        This extends BaseObject.prepare_save(), so the duration
+        is updated by both save() and save_many().
         """
         duration: float = 0
         for item in self.items:
@@ -98,7 +131,7 @@ class Bin(BaseObject):
         if duration != self.duration:
             log.debug(f"New duration of {self} is {s2tc(duration)}")
             self["duration"] = duration
-        super().save(**kwargs)
+        super().prepare_save(**kwargs)
 
 
 object_helper["bin"] = Bin
@@ -0,0 +1,243 @@
+"""Persistent cache of mediaprobe results.
+
+Results are stored in a SQLite database in the data directory, keyed
+by the file path and identified by its size, mtime and inode, so an
+unchanged file is never probed twice, even across service restarts.
+The cache is shared by all services running on the host.
+
+The least recently used entries are evicted when the cache grows over
+config.probe_cache_size entries.
+
+Command line interface (./manage probe-cache):
+
+    warm [--recursive] PATH...  probe files (and directories) into the cache
+    invalidate PATH...          remove cached results of the files
+    clear                       remove all cached results
+    stats                       print the number of cached results
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from nebula.config import config
+from nebula.log import log
+from nebula.serialization import json_dumps, json_loads
+
+# Evict entries after this many insertions (checking the size on every
+# insertion would be needlessly expensive)
+EVICTION_CHECK_INTERVAL = 100
+
+# Seconds to wait for a lock held by another process sharing the cache
+BUSY_TIMEOUT = 5
+
+FileKey = tuple[int, int, int]  # (size, mtime_ns, inode)
+
+
+def file_key(stat_result: os.stat_result) -> FileKey:
+    return (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+
+class ProbeCache:
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()
+        self.conn: sqlite3.Connection | None = None
+        self.failed = False
+        self.insertions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and not self.failed
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the database connection. Must be called with the lock held"""
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS probes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    meta TEXT NOT NULL,
+                    atime REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS probes_atime ON probes (atime)")
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def _handle_error(self, error: Exception, action: str) -> None:
+        """Skip the operation if the database is busy, otherwise disable the cache.
+
+        The cache is shared by the services of the host, so it may stay
+        locked for longer than BUSY_TIMEOUT. Other errors (corrupt or
+        unwritable file) persist, so the cache is not used anymore.
+        """
+        message = str(error).lower()
+        if isinstance(error, sqlite3.OperationalError) and (
+            "locked" in message or "busy" in message
+        ):
+            log.debug(f"Unable to {action} probe cache: {error}")
+            return
+        log.warning(f"Probe cache disabled. Unable to {action} {self.path}: {error}")
+        self.failed = True
+
+    def get(self, path: str, key: FileKey) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        with self.lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    """
+                    SELECT meta FROM probes
+                    WHERE path=? AND size=? AND mtime_ns=? AND inode=?
+                    """,
+                    [path, *key],
+                ).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                self._handle_error(e, "read")
+                return None
+            if row is None:
+                return None
+            try:
+                conn.execute(
+                    "UPDATE probes SET atime=? WHERE path=?", [time.time(), path]
+                )
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                # the result is valid even if its access time is not updated
+                conn.rollback()
+                self._handle_error(e, "update")
+        return json_loads(row[0])
+
+    def put(self, path: str, key: FileKey, meta: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            conn = None
+            try:
+                conn = self._connect()
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO probes
+                    (path, size, mtime_ns, inode, meta, atime)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    [path, *key, json_dumps(meta), time.time()],
+                )
+                self.insertions += 1
+                if self.insertions % EVICTION_CHECK_INTERVAL == 0:
+                    self._evict(conn)
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                if conn is not None:
+                    conn.rollback()
+                self._handle_error(e, "write")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM probes").fetchone()
+        if count <= self.size:
+            return
+        conn.execute(
+            """
+            DELETE FROM probes WHERE path IN (
+                SELECT path FROM probes ORDER BY atime LIMIT ?
+            )
+            """,
+            [count - self.size],
+        )
+
+    def invalidate(self, paths: list[str]) -> int:
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.executemany(
+                "DELETE FROM probes WHERE path=?", [[path] for path in paths]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self.lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM probes")
+            conn.commit()
+
+    def count(self) -> int:
+        with self.lock:
+            (count,) = self._connect().execute("SELECT COUNT(*) FROM probes").fetchone()
+            return count
+
+
+probe_cache = ProbeCache(
+    os.path.join(config.data_dir, "probe_cache.sqlite"),
+    config.probe_cache_size,
+)
+
+
+#
+# Command line interface
+#
+
+
+def _iter_paths(paths: list[str], recursive: bool):
+    for path in paths:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            for file_name in files:
+                yield os.path.join(root, file_name)
+            if not recursive:
+                dirs.clear()
+
+
+def main(args: list[str]) -> int:
+    # imported here: mediaprobe uses this module
+    from nebula.mediaprobe import mediaprobe
+
+    parser = argparse.ArgumentParser(prog="manage probe-cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="probe files into the cache")
+    warm.add_argument("--recursive", "-r", action="store_true")
+    warm.add_argument("paths", nargs="+")
+    invalidate = commands.add_parser("invalidate", help="remove cached files")
+    invalidate.add_argument("paths", nargs="+")
+    commands.add_parser("clear", help="remove all cached results")
+    commands.add_parser("stats", help="print the number of cached results")
+    opts = parser.parse_args(args)
+
+    if opts.command == "warm":
+        if not probe_cache.enabled:
+            log.error("Probe cache is disabled (probe_cache_size is 0)")
+            return 1
+        count = 0
+        for path in _iter_paths(opts.paths, opts.recursive):
+            if mediaprobe(path):
+                count += 1
+        log.info(f"{count} files are cached")
+    elif opts.command == "invalidate":
+        paths = [os.path.abspath(path) for path in opts.paths]
+        log.info(f"Removed {probe_cache.invalidate(paths)} cached results")
+    elif opts.command == "clear":
+        probe_cache.clear()
+        log.info("Probe cache cleared")
+    elif opts.command == "stats":
+        print(f"{probe_cache.count()} cached results in {probe_cache.path}")
+    return 0
@@ -0,0 +1,204 @@
+"""Indexes required by the worker and checks of the hot queries.
+
+Asset lookups by path (asset_by_path) and by an import identifier
+(meta_exists, used by the import service) filter on values inside the
+meta JSONB column. Without expression indexes these are sequential scans
+over the whole assets table.
+
+Only the looked up keys are indexed: assets are the most written table,
+and an index of the whole meta document would be updated on every save.
+
+check_schema() creates the missing indexes and then runs EXPLAIN on the
+hot queries, warning if any of them still can't use an index.
+"""
+
+import re
+from typing import Any
+
+import psycopg2
+from nxtools import xml
+
+from nebula.db import DB
+from nebula.enum import MediaType
+from nebula.log import log
+
+# Index name: definition. Indexes are created concurrently,
+# so they don't lock the assets table while they are being built.
+INDEXES: dict[str, str] = {
+    # asset_by_path
+    "idx_assets_storage_path": """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assets_storage_path
+        ON assets ((meta->>'id_storage'), (meta->>'path'))
+    """,
+}
+
+# Metadata keys which may be used in index definitions
+VALID_KEY = re.compile(r"^[\w/.-]+$")
+
+# Held while indexes are created, so only one host builds them
+SCHEMA_LOCK_KEY = 0x4E53  # "NS"
+
+# Label, query, arguments. The same queries are used in nebula.helpers.
+HOT_QUERIES: list[tuple[str, str, list[Any]]] = [
+    (
+        "asset_by_path",
+        """
+        SELECT meta FROM assets
+            WHERE media_type = %s
+            AND meta->>'id_storage' = %s
+            AND meta->>'path' = %s
+        """,
+        [MediaType.FILE, "1", "media.dir/example.mxf"],
+    ),
+]
+
+
+def identifier_keys(db: DB) -> list[str]:
+    """Return metadata keys import actions use to find existing assets"""
+    db.query("SELECT title, settings FROM actions WHERE service_type = 'import'")
+    keys: set[str] = set()
+    for title, action_settings in db.fetchall():
+        try:
+            identifier = xml(action_settings).find("identifier")
+        except Exception:
+            continue
+        key = identifier.text if identifier is not None and identifier.text else "id"
+        if not VALID_KEY.match(key):
+            log.warning(f"Unable to index identifier {key!r} of action {title}")
+            continue
+        keys.add(key)
+    return sorted(keys)
+
+
+def identifier_index_name(key: str) -> str:
+    return "idx_assets_meta_" + re.sub(r"\W", "_", key)
+
+
+def get_indexes(keys: list[str]) -> dict[str, str]:
+    """Return the static indexes and indexes of the given identifier keys"""
+    result = dict(INDEXES)
+    for key in keys:
+        name = identifier_index_name(key)
+        result[name] = f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+            ON assets ((meta->>'{key}'))
+        """
+    return result
+
+
+def get_hot_queries(keys: list[str]) -> list[tuple[str, str, list[Any]]]:
+    result = list(HOT_QUERIES)
+    for key in keys:
+        result.append(
+            (
+                f"meta_exists({key})",
+                "SELECT meta FROM assets WHERE meta->>%s = %s LIMIT 1",
+                [key, "example"],
+            )
+        )
+    return result
+
+
+def create_indexes(db: DB, indexes: dict[str, str]) -> bool:
+    """Create missing indexes and rebuild invalid ones.
+
+    An index is left invalid when its concurrent build fails
+    (for example when the worker is stopped during the build),
+    but it is invalid during the build as well. Indexes being built
+    are skipped and the dispatch processes of all hosts are serialized
+    using an advisory lock, so a host never drops an index another
+    host is building.
+
+    Returns False if another host is creating the indexes.
+    """
+    assert db.conn is not None, "Database connection is closed"
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    db.rollback()
+    db.conn.autocommit = True
+    try:
+        db.query("SELECT pg_try_advisory_lock(%s)", [SCHEMA_LOCK_KEY])
+        if not db.fetchall()[0][0]:
+            log.info("Indexes are being created by another host")
+            return False
+        try:
+            _create_indexes(db, indexes)
+        finally:
+            db.query("SELECT pg_advisory_unlock(%s)", [SCHEMA_LOCK_KEY])
+    finally:
+        db.conn.autocommit = False
+    return True
+
+
+def _create_indexes(db: DB, indexes: dict[str, str]) -> None:
+    names = list(indexes)
+    db.query(
+        """
+        SELECT c.relname, i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(%s)
+        """,
+        [names],
+    )
+    existing = dict(db.fetchall())
+    db.query(
+        """
+        SELECT c.relname
+        FROM pg_stat_progress_create_index p
+        JOIN pg_class c ON c.oid = p.index_relid
+        WHERE c.relname = ANY(%s)
+        """,
+        [names],
+    )
+    building = {name for (name,) in db.fetchall()}
+
+    for name, definition in indexes.items():
+        if existing.get(name):
+            continue
+        if name in building:
+            log.info(f"Index {name} is being built")
+            continue
+        if name in existing:
+            log.warning(f"Index {name} is invalid. Rebuilding")
+            db.query(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        log.info(f"Creating index {name}")
+        try:
+            db.query(definition)
+        except psycopg2.Error as e:
+            log.error(f"Unable to create index {name}: {e}")
+
+
+def check_query_plans(db: DB, queries: list[tuple[str, str, list[Any]]]) -> bool:
+    """Warn if any of the hot queries uses a sequential scan.
+
+    Sequential scans are disabled for the check, so the planner
+    uses one only if there is no usable index (on small tables
+    it would prefer a sequential scan anyway).
+    """
+    result = True
+    for label, query, args in queries:
+        try:
+            db.query("SET LOCAL enable_seqscan = off")
+            db.query(f"EXPLAIN {query}", args)
+            plan = "\n".join(row[0] for row in db.fetchall())
+        except psycopg2.Error as e:
+            log.warning(f"Unable to check query plan of {label}: {e}")
+            result = False
+        else:
+            if "Seq Scan" in plan:
+                log.warning(f"Query {label} uses a sequential scan:\n{plan}")
+                result = False
+        db.rollback()
+    return result
+
+
+def check_schema() -> bool:
+    """Create worker indexes and verify the hot queries use them"""
+    db = DB()
+    try:
+        keys = identifier_keys(db)
+        if not create_indexes(db, get_indexes(keys)):
+            return True
+        return check_query_plans(db, get_hot_queries(keys))
+    finally:
+        db.close()
@@ -0,0 +1,30 @@
+"""JSON serialization using orjson when available, stdlib json otherwise"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+HAS_ORJSON = orjson is not None
+
+
+def json_dumps(data: Any) -> str:
+    """Serialize data to a JSON string"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson does not handle integers over 64 bits
+            # and some types the stdlib encoder accepts
+            pass
+    return json.dumps(data)
+
+
+def json_loads(data: str | bytes) -> Any:
+    """Deserialize a JSON string"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
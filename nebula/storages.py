@@ -1,8 +1,11 @@
 import os
 import posixpath
+import threading
+import time
 
 from nebula.config import config
 from nebula.log import log
+from nebula.serialization import json_dumps, json_loads
 from nebula.settings import settings
 from nebula.settings.models import StorageSettings
 
@@ -93,3 +96,82 @@ class Storages:
 
 
 storages = Storages()
+
+
+#
+# Storage availability
+#
+
+# Seconds after which a cached mount state is checked again
+STORAGE_STATUS_TTL = 30
+
+
+class StorageStatus:
+    """Cached mount state of storages on this host.
+
+    The dispatch StorageMonitor checks the storages every few seconds
+    and publishes the result to a file in the data directory, so other
+    processes don't need to list storage roots themselves. When the
+    published state is older than `ttl` (dispatch is not running),
+    the storage is checked directly and the result cached for `ttl`.
+    """
+
+    def __init__(self, path: str, ttl: float = STORAGE_STATUS_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # id_storage: (is_mounted, checked_at)
+        self.status: dict[int, tuple[bool, float]] = {}
+
+    def publish(self, mounted: dict[int, bool]) -> None:
+        """Store the mount state of storages (called by StorageMonitor)"""
+        now = time.time()
+        with self.lock:
+            for id_storage, is_mounted in mounted.items():
+                self.status[id_storage] = (is_mounted, now)
+        data = {"time": now, "mounted": mounted}
+        tmp_path = f"{self.path}.{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                f.write(json_dumps(data))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning(f"Unable to publish storage status: {e}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json_loads(f.read())
+            checked_at = float(data["time"])
+            mounted = {int(k): bool(v) for k, v in data["mounted"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        with self.lock:
+            for id_storage, is_mounted in mounted.items():
+                if checked_at > self.status.get(id_storage, (False, 0))[1]:
+                    self.status[id_storage] = (is_mounted, checked_at)
+
+    def _get(self, id_storage: int) -> bool | None:
+        is_mounted, checked_at = self.status.get(id_storage, (False, 0))
+        if time.time() - checked_at > self.ttl:
+            return None
+        return is_mounted
+
+    def is_mounted(self, id_storage: int) -> bool:
+        if (result := self._get(id_storage)) is not None:
+            return result
+        self._load()
+        if (result := self._get(id_storage)) is not None:
+            return result
+        result = storages[id_storage].is_mounted
+        with self.lock:
+            self.status[id_storage] = (result, time.time())
+        return result
+
+    def mounted(self) -> dict[int, bool]:
+        """Return the mount state of all configured storages by ID"""
+        return {storage.id: self.is_mounted(storage.id) for storage in storages}
+
+
+storage_status = StorageStatus(os.path.join(config.data_dir, "storage_status.json"))
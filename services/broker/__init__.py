@@ -1,3 +1,6 @@
+import time
+from typing import Any
+
 from nxtools import xml
 
 import nebula
@@ -5,7 +8,17 @@ from nebula.base_service import BaseService
 from nebula.db import DB
 from nebula.enum import ObjectStatus
 from nebula.jobs import Action, send_to
-from nebula.objects import Asset
+from nebula.objects import Asset, AssetView, save_many
+
+# Assets changed within this many seconds before the cursor are scanned again,
+# to catch transactions which committed after a newer mtime was already seen.
+# Processing an asset twice is harmless, it is skipped by its created_key.
+CURSOR_OVERLAP = 10
+
+DEFAULT_FULL_SCAN_INTERVAL = 3600
+
+# Assets with new created_key flags are saved in batches of this size
+SAVE_BATCH_SIZE = 100
 
 
 class Service(BaseService):
@@ -23,19 +36,83 @@ class Service(BaseService):
             settings = xml(settings)
             self.actions.append(Action(id, title, settings))
 
+        # Only assets changed since the last pass are evaluated.
+        # A full scan is performed every `full_scan_interval` seconds
+        # to catch changes which don't update the asset mtime.
+
+        self.full_scan_interval = DEFAULT_FULL_SCAN_INTERVAL
+        settings = getattr(self, "settings", None)
+        if settings is not None:
+            try:
+                self.full_scan_interval = int(
+                    settings.attrib.get(
+                        "full_scan_interval", DEFAULT_FULL_SCAN_INTERVAL
+                    )
+                )
+            except ValueError:
+                nebula.log.error("Invalid full_scan_interval value. Using default")
+
+        state = self.load_state()
+        self.mtime_cursor: float = state.get("mtime_cursor", 0)
+        self.last_full_scan: float = state.get("last_full_scan", 0)
+
     def on_main(self):
+        now = time.time()
+        full_scan = now - self.last_full_scan > self.full_scan_interval
+
+        if full_scan:
+            nebula.log.debug("Scanning all online assets")
+            query = "SELECT meta, mtime FROM assets WHERE status=%s"
+            args: list[Any] = [ObjectStatus.ONLINE]
+        else:
+            query = "SELECT meta, mtime FROM assets WHERE status=%s AND mtime >= %s"
+            args = [ObjectStatus.ONLINE, self.mtime_cursor - CURSOR_OVERLAP]
+
+        # Assets are streamed using a server-side cursor on its own
+        # connection. Jobs and created_key flags are saved using another one.
         db = DB()
-        db.query("SELECT id, meta FROM assets WHERE status=%s", [ObjectStatus.ONLINE])
-        for _, meta in db.fetchall():
-            asset = Asset(meta=meta, db=db)
-            self.proc(asset)
+        scan_db = DB()
+        mtime_cursor = self.mtime_cursor
+        changed: list[Asset] = []
+        for meta, mtime in scan_db.iterate(query, args):
+            if asset := self.proc(AssetView(meta, db=db)):
+                changed.append(asset)
+                if len(changed) >= SAVE_BATCH_SIZE:
+                    save_many(changed, db=db, set_mtime=False)
+                    changed = []
+            if mtime and mtime > mtime_cursor:
+                mtime_cursor = mtime
+
+        # created_key flags are saved in batches
+        save_many(changed, db=db, set_mtime=False)
+
+        if full_scan or mtime_cursor != self.mtime_cursor:
+            self.mtime_cursor = mtime_cursor
+            if full_scan:
+                self.last_full_scan = now
+            self.save_state(
+                {
+                    "mtime_cursor": self.mtime_cursor,
+                    "last_full_scan": self.last_full_scan,
+                }
+            )
+
+    def proc(self, view: AssetView) -> Asset | None:
+        """Create jobs for actions whose conditions the asset matches.
 
-    def proc(self, asset):
+        Returns the asset if its metadata was changed and should be saved.
+        Most assets don't match any action, so they are never promoted
+        from the view to a full Asset.
+        """
+        asset: Asset | None = None
         for action in self.actions:
-            if action.created_key in asset.meta:
+            current = view if asset is None else asset
+            if action.created_key in current.meta:
                 continue
 
-            if action.should_create(asset):
+            if action.should_create(current):
+                asset = view.to_asset()
+                assert asset.id is not None, "Scanned assets are always saved"
                 nebula.log.info(f"{asset} matches action condition {action.title}")
                 try:
                     _ = send_to(
@@ -49,4 +126,4 @@ class Service(BaseService):
                     nebula.log.error(f"Failed to send {asset} to {action.title}: {e}")
 
                 asset[action.created_key] = 1
-                asset.save(set_mtime=False)
+        return asset
@@ -32,6 +32,10 @@ class BaseEncoder:
         self.progress = 0
         self.message = "Started"
         self.aborted = False
+        # Encoding speed (x realtime) and other encoder statistics,
+        # if the encoder reports them
+        self.speed: float | None = None
+        self.stats: dict[str, Any] = {}
 
     def configure(self):
         raise NotImplementedError
@@ -6,7 +6,7 @@ import nebula
 from nebula.base_service import BaseService
 from nebula.db import DB
 from nebula.enum import JobState
-from nebula.jobs import Action, get_job
+from nebula.jobs import Action, ProgressReporter, get_job
 from services.conv.ffmpeg import NebulaFFMPEG
 from services.conv.melt import NebulaMelt
 
@@ -58,12 +58,17 @@ class Service(BaseService):
         db.commit()
 
     def progress_handler(self, progress: float | None = None):
-        stat = self.job.get_status()
+        # The encoder keeps reporting progress until it exits
+        if self.encoder.aborted or self.progress.closed:
+            return
+        stat = self.progress.poll_status()
         if stat == JobState.RESTART:
+            self.progress.close()
             self.encoder.stop()
             self.job.restart()
             return
         elif stat == JobState.ABORTED:
+            self.progress.close()
             self.encoder.stop()
             self.job.abort()
             return
@@ -72,7 +77,9 @@ class Service(BaseService):
             progress = 0
         else:
             message = f"Encoding: {progress:.02f}%"
-        self.job.set_progress(progress, message)
+        if self.encoder.speed:
+            message += f" ({self.encoder.speed:.02f}x realtime)"
+        self.progress.update(progress, message, stage="encoding")
 
     def on_main(self):
         db = DB()
@@ -82,6 +89,7 @@ class Service(BaseService):
         if not self.job:
             return
         nebula.log.info(f"Got {self.job}")
+        self.progress = ProgressReporter(self.job)
 
         asset = self.job.asset
         action = self.job.action
@@ -128,6 +136,7 @@ class Service(BaseService):
 
             if self.encoder.aborted:
                 return
+            self.progress.flush()
 
             nebula.log.debug(f"Finalizing task {id_task+1} of {len(tasks)}")
             try:
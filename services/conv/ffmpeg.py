@@ -1,5 +1,4 @@
 import os
-import re
 import signal
 import subprocess
 
@@ -7,13 +6,7 @@ import nebula
 from nebula.storages import storages
 
 from .common import BaseEncoder, ConversionError, temp_file
-
-re_position = re.compile(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})\d*", re.U | re.I)
-
-
-def time2sec(search):
-    hh, mm, ss, cs = search.group(1), search.group(2), search.group(3), search.group(4)
-    return int(hh) * 3600 + int(mm) * 60 + int(ss) + int(cs) / 100.0
+from .output import ErrorLog, FFmpegProgress, read_lines
 
 
 class NebulaFFMPEG(BaseEncoder):
@@ -26,7 +19,7 @@ class NebulaFFMPEG(BaseEncoder):
         params = self.params
         assert asset
         assert params is not None
-        self.error_log = ""
+        self.error_log = ErrorLog()
 
         for p in self.task:
             if p.tag == "param":
@@ -94,14 +87,26 @@ class NebulaFFMPEG(BaseEncoder):
         return self.proc.poll() is None
 
     def start(self) -> None:
-        cmd = ["ffmpeg", "-hide_banner"]
+        # Progress is reported using the machine-readable -progress stream
+        # written to a dedicated pipe. Stderr is kept for errors only.
+        progress_read, progress_write = os.pipe()
+        cmd = ["ffmpeg", "-hide_banner", "-nostats"]
+        cmd.extend(["-progress", f"pipe:{progress_write}"])
         cmd.extend(str(arg) for arg in self.ffparams)
         nebula.log.info(f"Executing {' '.join(cmd)}")
-        self.proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        try:
+            self.proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(progress_write,),
+            )
+        except Exception:
+            os.close(progress_read)
+            raise
+        finally:
+            os.close(progress_write)
+        self.progress_pipe = os.fdopen(progress_read, "rb")
 
     def stop(self) -> None:
         if self.proc and self.proc.poll() is None:
@@ -113,40 +118,34 @@ class NebulaFFMPEG(BaseEncoder):
         assert self.proc.stderr
 
         duration = self.asset["duration"]
-        buff = b""
-
-        while True:
-            ch = self.proc.stderr.read(1)
-            if not ch:
-                break
-            if ch in [b"\n", b"\r"]:
-                line = buff.decode("utf-8", errors="ignore").strip()
-
-                position_match = re_position.search(line)
-                if position_match:
-                    position = time2sec(position_match)
-                    if not duration:
-                        progress_handler(None)
-                    else:
-                        progress = (position / duration) * 100
-                        progress_handler(progress)
-                    self.error_log = ""
-
-                elif line == "Press [q] to stop, [?] for help":
-                    self.error_log = ""
+        parser = FFmpegProgress()
+
+        def handle_progress(line: str) -> None:
+            stats = parser.feed(line)
+            if stats is None:
+                return
+            self.stats = stats
+            self.speed = stats["speed"]
+            position = stats["out_time"]
+            if not duration or position is None:
+                progress_handler(None)
+            else:
+                progress_handler(min(100, position / duration * 100))
 
-                else:
-                    self.error_log += line + "\n"
-                buff = b""
+        def handle_stderr(line: str) -> None:
+            if line == "Press [q] to stop, [?] for help":
+                self.error_log.clear()
             else:
-                buff += ch
+                self.error_log.append(line)
 
-        if self.proc:
-            self.proc.wait()
-            if self.proc.stderr:
-                self.error_log += self.proc.stderr.read().decode(
-                    "utf-8", errors="ignore"
-                )
+        with self.progress_pipe:
+            read_lines(
+                {
+                    self.progress_pipe: handle_progress,
+                    self.proc.stderr: handle_stderr,
+                }
+            )
+        self.proc.wait()
 
     def finalize(self) -> None:
         if not self.proc:
@@ -161,7 +160,7 @@ class NebulaFFMPEG(BaseEncoder):
                     pass
 
         if self.proc.returncode > 0:
-            nebula.log.error(self.proc.stderr.read())
+            nebula.log.error(str(self.error_log))
             raise ConversionError("Encoding failed")
 
         for temp_path, target_path in self.files.items():
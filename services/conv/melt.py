@@ -10,6 +10,7 @@ import nebula
 from nebula.storages import storages
 
 from .common import BaseEncoder, ConversionError, temp_file
+from .output import ErrorLog, iter_lines
 
 
 def process_template(source_path: str, context: dict[str, Any] | None = None) -> str:
@@ -41,6 +42,7 @@ class NebulaMelt(BaseEncoder):
         assert params is not None
 
         self.files = {}
+        self.error_log = ErrorLog()
         self.cmd = ["melt", "-progress"]
 
         source_path = os.path.join(
@@ -125,40 +127,37 @@ class NebulaMelt(BaseEncoder):
             self.cmd,
             stderr=subprocess.PIPE,
             stdout=None,
-            universal_newlines=True,
         )
 
     def stop(self) -> None:
         if not self.is_running:
             return None
+        self.aborted = True
         self.proc.send_signal(signal.SIGINT)  # type: ignore
 
     def wait(self, progress_handler: Callable) -> None:
-        buff = ""
         current_percent = 0
         assert self.proc
         assert self.proc.stderr
-        while self.proc.poll() is None:
-            buff += self.proc.stderr.read(1)
-            if buff.endswith("\r") or buff.endswith("\n"):
-                line = buff.strip()
-                if line.startswith("Current"):
-                    try:
-                        progress = int(line.split(":")[-1].strip())
-                    except ValueError:
-                        pass
-                    else:
-                        if current_percent != progress:
-                            current_percent = progress
-                            progress_handler(progress)
-                buff = ""
+        for line in iter_lines(self.proc.stderr):
+            if line.startswith("Current"):
+                try:
+                    progress = int(line.split(":")[-1].strip())
+                except ValueError:
+                    pass
+                else:
+                    if current_percent != progress:
+                        current_percent = progress
+                        progress_handler(progress)
+            else:
+                self.error_log.append(line)
         self.proc.wait()
 
     def finalize(self) -> None:
         assert self.proc
         assert self.proc.stderr
         if self.proc.returncode > 0:
-            nebula.log.error(self.proc.stderr.read())
+            nebula.log.error(str(self.error_log))
             raise ConversionError("Encoding failed")
 
         for temp_path in self.files:
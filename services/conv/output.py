@@ -0,0 +1,160 @@
+"""Helpers for reading encoder output.
+
+This module must not import nebula, so it can be used by
+support/benchmarks without a database connection.
+"""
+
+import os
+import selectors
+from collections import deque
+from collections.abc import Callable, Generator
+from typing import IO, Any
+
+READ_CHUNK_SIZE = 65536
+ERROR_LOG_LINES = 100
+
+
+class LineSplitter:
+    """Split chunks of binary output to non-empty lines.
+
+    Both \\r (used by ffmpeg and melt for status lines) and \\n end a line.
+    Incomplete lines are kept until the next chunk arrives.
+    """
+
+    def __init__(self) -> None:
+        self.tail = b""
+
+    def feed(self, chunk: bytes) -> list[str]:
+        lines = (self.tail + chunk).splitlines()
+        if chunk[-1:] in (b"\r", b"\n"):
+            self.tail = b""
+        else:
+            self.tail = lines.pop()
+        return [
+            line
+            for raw_line in lines
+            if (line := raw_line.decode("utf-8", errors="ignore").strip())
+        ]
+
+    def close(self) -> list[str]:
+        tail, self.tail = self.tail, b""
+        if line := tail.decode("utf-8", errors="ignore").strip():
+            return [line]
+        return []
+
+
+def iter_lines(
+    stream: IO[bytes],
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Generator[str, None, None]:
+    """Yield non-empty lines from a binary stream until EOF.
+
+    Data is read from the underlying file descriptor in chunks of up to
+    `chunk_size` bytes. os.read returns as soon as any data is available,
+    so progress lines are yielded as soon as the process writes them.
+    """
+    fd = stream.fileno()
+    splitter = LineSplitter()
+    while True:
+        chunk = os.read(fd, chunk_size)
+        if not chunk:
+            break
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def read_lines(
+    handlers: dict[IO[bytes], Callable[[str], Any]],
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> None:
+    """Read lines from several streams until all of them are closed.
+
+    Each line is passed to the handler of the stream it was read from.
+    Streams are read as data arrives, so a process writing to one of them
+    never blocks on a full pipe while we wait for the other.
+    """
+    splitters: dict[int, LineSplitter] = {}
+    with selectors.DefaultSelector() as selector:
+        for stream, handler in handlers.items():
+            splitters[stream.fileno()] = LineSplitter()
+            selector.register(stream, selectors.EVENT_READ, handler)
+
+        while selector.get_map():
+            for key, _ in selector.select():
+                splitter = splitters[key.fd]
+                chunk = os.read(key.fd, chunk_size)
+                if chunk:
+                    lines = splitter.feed(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+                    lines = splitter.close()
+                for line in lines:
+                    key.data(line)
+
+
+class ErrorLog:
+    """Ring buffer keeping the last `size` lines of encoder output"""
+
+    def __init__(self, size: int = ERROR_LOG_LINES) -> None:
+        self.lines: deque[str] = deque(maxlen=size)
+
+    def append(self, line: str) -> None:
+        self.lines.append(line)
+
+    def clear(self) -> None:
+        self.lines.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self.lines)
+
+    def __str__(self) -> str:
+        return "\n".join(self.lines)
+
+
+#
+# ffmpeg -progress
+#
+
+
+def _to_float(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:  # N/A
+        return None
+
+
+class FFmpegProgress:
+    """Parser of the machine-readable ffmpeg -progress stream.
+
+    ffmpeg writes blocks of key=value lines, each block terminated
+    by progress=continue (or progress=end for the last one).
+    feed() returns the parsed stats when a block is complete.
+    """
+
+    def __init__(self) -> None:
+        self.block: dict[str, str] = {}
+
+    def feed(self, line: str) -> dict[str, Any] | None:
+        key, _, value = line.partition("=")
+        key = key.strip()
+        value = value.strip()
+        if key != "progress":
+            self.block[key] = value
+            return None
+
+        block, self.block = self.block, {}
+
+        # out_time_ms is in microseconds as well (for historical reasons)
+        out_time_us = _to_float(block.get("out_time_us") or block.get("out_time_ms"))
+        frame = _to_float(block.get("frame"))
+        bitrate = block.get("bitrate", "")
+        return {
+            "frame": int(frame) if frame is not None else None,
+            "fps": _to_float(block.get("fps")),
+            "bitrate": _to_float(bitrate.removesuffix("kbits/s")),
+            "speed": _to_float(block.get("speed", "").removesuffix("x")),
+            "out_time": out_time_us / 1_000_000 if out_time_us is not None else None,
+            "finished": value == "end",
+        }
@@ -6,6 +6,7 @@ import nebula
 from nebula.base_service import BaseService
 from nebula.enum import ContentType, JobState, MediaType
 from nebula.filetypes import FileTypes
+from nebula.helpers import meta_exists
 
 from .common import ImportDefinition, create_error
 from .process import import_asset
@@ -107,16 +108,8 @@ class Service(BaseService):
         # check whether the file matches the ident in the DB
 
         db = nebula.DB()
-        db.query(
-            f"""
-            SELECT meta FROM assets WHERE
-            meta->>'{action.identifier}' = '{path.base_name}'
-            """
-        )
-
-        try:
-            asset = nebula.Asset(meta=db.fetchall()[0][0])
-        except IndexError:
+        asset = meta_exists(action.identifier, path.base_name, db=db)
+        if asset is None:
             create_error(path, f"Unexpected file {path.base_name}")
             return
 
@@ -6,7 +6,7 @@ from nxtools import FileObject
 import nebula
 from nebula.db import DB
 from nebula.enum import ObjectStatus
-from nebula.jobs import Job, send_to
+from nebula.jobs import Job, ProgressReporter, send_to
 from nebula.objects import Asset
 
 from .common import ImportDefinition, create_error
@@ -37,6 +37,8 @@ def get_import_job(
         return None
 
     job = Job(id_job, db=db)
+    if not job.start(service):
+        nebula.log.warning(f"Unable to start {job}. Its progress won't be stored")
     job.set_progress(0, "Importing")
     return job
 
@@ -85,10 +87,10 @@ def import_asset(
     )
     db.commit()
 
-    def progress_handler(progress: float) -> None:
-        if not job:
-            return
-        job.set_progress(progress, f"Importing {progress:.02f}%")
+    progress = ProgressReporter(job)
+
+    def progress_handler(value: float) -> None:
+        progress.update(value, f"Importing {value:.02f}%", stage="importing")
 
     if not ensure_target(asset.file_path):
         job.fail("Unable to create target file")
@@ -125,6 +127,7 @@ def import_asset(
         # Result is still false, so job will fail
         # We just log the problem
         nebula.log.error(f"{e}")
+    progress.flush()
 
     # Move temp file to asset file
 
@@ -174,7 +177,7 @@ def import_asset(
         for key in allkeys:
             metatype = nebula.settings.metatypes.get(key)
             if metatype and (metatype.ns in ["q", "f"]):
-                del asset.meta[key]
+                del asset[key]
         asset["status"] = ObjectStatus.OFFLINE
         asset.save()
 
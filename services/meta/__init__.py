@@ -1,18 +1,21 @@
-import os
 import time
-from typing import Literal
-
-from nxtools import FileObject
+from collections.abc import Generator
+from typing import Any, Literal
 
 import nebula
 from nebula.base_service import BaseService
 from nebula.db import DB
 from nebula.enum import ContentType, MediaType, ObjectStatus
-from nebula.objects import Asset
+from nebula.objects import Asset, AssetView
 from nebula.settings import settings
-from nebula.storages import storages
+from nebula.storages import storage_status, storages
+
+from .dir_cache import DirectoryCache
+from .ffprobe import apply_probe_result
+from .probe_pool import DEFAULT_PROBE_WORKERS, ProbePool, ProbeRequest
+from .shard import MetaShard, check_shard_coverage, load_meta_shards
 
-from .ffprobe import ffprobe_asset
+PROBED_CONTENT_TYPES = (ContentType.VIDEO, ContentType.AUDIO, ContentType.IMAGE)
 
 
 class Service(BaseService):
@@ -40,69 +43,147 @@ class Service(BaseService):
             x = eval(f"lambda asset: {cond.text}")
             self.conds.append(x)
 
+        # Files are probed in parallel by a pool of worker threads,
+        # so a slow file does not stall the scan.
+        try:
+            probe_workers = int(
+                self.settings.attrib.get("probe_workers", DEFAULT_PROBE_WORKERS)
+            )
+            probe_workers_per_storage = int(
+                self.settings.attrib.get("probe_workers_per_storage", 0)
+            )
+        except ValueError:
+            nebula.log.error("Invalid probe_workers value. Using defaults")
+            probe_workers = DEFAULT_PROBE_WORKERS
+            probe_workers_per_storage = 0
+        self.probe_pool = ProbePool(probe_workers, probe_workers_per_storage)
+
+        # Multiple meta services may split the assets between them
+        try:
+            self.shard = MetaShard.from_settings(self.settings)
+        except ValueError as e:
+            # scanning all assets would overlap with the other instances
+            nebula.log.error(f"Invalid storages or shard value: {e}. Shutting down")
+            self.shutdown(no_restart=True)
+        if not self.shard.is_full:
+            nebula.log.info(f"Scanning {self.shard}")
+        shards = load_meta_shards(DB())
+        shards[self.id_service] = self.shard
+        check_shard_coverage(list(shards.values()))
+
+    def on_shutdown(self):
+        if hasattr(self, "probe_pool"):
+            self.probe_pool.shutdown()
+
     def on_main(self):
-        self.mounted_storages = []
-        for id_storage in storages:
-            storage_path = storages[id_storage].local_path
-            if os.path.exists(storage_path) and len(os.listdir(storage_path)) != 0:
-                self.mounted_storages.append(id_storage)
+        # Files are stat'ed using one directory listing per directory
+        self.dir_cache = DirectoryCache()
+        for asset in self.scan_assets():
+            self.process(asset)
+            self.apply_probe_results()
+        self.apply_probe_results()
 
+    def apply_probe_results(self) -> None:
+        for request, meta in self.probe_pool.completed():
+            try:
+                self.update_metadata(request.asset, request.file_info, meta)
+            except Exception:
+                nebula.log.traceback(f"Unable to update metadata of {request.asset}")
+
+    def scan_assets(self) -> Generator[AssetView, None, None]:
+        """Stream file assets from the database.
+
+        Assets are fetched in batches using a server-side cursor on its
+        own connection, while changes are saved using another one.
+        Assets are ordered by path, so files from one directory
+        are processed together. Paths are compared bytewise (collation
+        "C"): locale collations ignore punctuation such as "/" and could
+        interleave files from different directories.
+        """
         db = DB()
+        scan_db = DB()
+        shard_conds, shard_args = self.shard.sql_conditions()
         # do not scan trashed and archived files
-        db.query(
-            """
+        for (meta,) in scan_db.iterate(
+            f"""
             SELECT meta FROM assets
             WHERE media_type=%s
             AND status NOT IN (3, 4)
+            {shard_conds}
+            ORDER BY meta->>'id_storage', meta->>'path' COLLATE "C"
             """,
-            [MediaType.FILE],
-        )
-        i = 0
-        for (meta,) in db.fetchall():
-            asset = Asset(meta=meta, db=db)
-            self.process(asset)
-            i += 1
+            [MediaType.FILE, *shard_args],
+        ):
+            yield AssetView(meta, db=db)
+
+    def update_metadata(
+        self,
+        asset: Asset,
+        file_info: dict[str, int],
+        probe_result: dict[str, Any] | None,
+    ) -> None:
+        """Replace technical metadata of the asset and save it"""
+        keys = list(asset.meta.keys())
+        for key in keys:
+            if key in settings.metatypes:
+                if settings.metatypes[key].ns in ("f", "q"):
+                    del asset[key]
+        asset.update(file_info)
+
+        if not probe_result:
+            asset.save()
+            return
+
+        apply_probe_result(asset, probe_result)
+        if asset["status"] == ObjectStatus.RESET:
+            asset["status"] = ObjectStatus.ONLINE
+            nebula.log.info(f"{asset}: Metadata reset completed")
+        else:
+            asset["status"] = ObjectStatus.CREATING
+        asset.save()
+
+    def process(self, asset: Asset | AssetView):
+        # Assets are scanned using read-only views. A view is promoted
+        # to a full Asset (to_asset) only when the asset needs to be saved.
+        if asset.id is None or asset.id in self.probe_pool:
+            return
 
-    def process(self, asset):
         for cond in self.conds:
             if not cond(asset):
                 return
 
-        asset_file = FileObject(asset.file_path)
         id_storage = asset["id_storage"]
         if not id_storage:
             return
-        if (
-            storages[id_storage].protocol != "local"
-            and id_storage not in self.mounted_storages
-        ):
+        storage = storages[id_storage]
+        if storage.protocol != "local" and not storage_status.is_mounted(storage.id):
             nebula.log.warning(
                 f"Skipping unmounted storage {asset['id_storage']} of {asset}"
             )
             return
 
-        try:
-            file_exists = asset_file.is_reg
-        except OSError:
-            file_exists = False
+        file_path = asset.file_path
+        file_stat = self.dir_cache.stat(file_path)
 
-        if not file_exists:
+        if file_stat is None:
             if asset["status"] in [
                 ObjectStatus.ONLINE,
                 ObjectStatus.RESET,
                 ObjectStatus.CREATING,
             ]:
                 nebula.log.warning(f"{asset}: Turning offline")
+                asset = asset.to_asset()
                 asset["status"] = ObjectStatus.OFFLINE
                 asset.save()
             return
 
-        fmtime = int(asset_file.mtime)
-        fsize = int(asset_file.size)
+        fmtime = int(file_stat.st_mtime)
+        fsize = int(file_stat.st_size)
 
         if fsize == 0:
             if asset["status"] not in [ObjectStatus.OFFLINE, ObjectStatus.RETRIEVING]:
                 nebula.log.warning(f"{asset}: Turning offline (empty file)")
+                asset = asset.to_asset()
                 asset["status"] = ObjectStatus.OFFLINE
                 asset.save()
             return
@@ -111,8 +192,9 @@ class Service(BaseService):
             ObjectStatus.RESET,
             ObjectStatus.RETRIEVING,
         ]:
+            asset = asset.to_asset()
             try:
-                f = asset_file.open("rb")
+                f = open(file_path, "rb")
             except Exception:
                 nebula.log.debug(f"{asset} is not readable (transfer in progress?)")
                 return
@@ -146,51 +228,33 @@ class Service(BaseService):
                         f"{asset}: File has been changed. Updating metadata."
                     )
 
-                keys = list(asset.meta.keys())
-                for key in keys:
-                    if key in settings.metatypes:
-                        if settings.metatypes[key].ns in ("f", "q"):
-                            del asset.meta[key]
+                file_info = {
+                    "file/size": fsize,
+                    "file/mtime": fmtime,
+                    "file/ctime": int(file_stat.st_ctime),
+                }
 
-                asset["file/size"] = fsize
-                asset["file/mtime"] = fmtime
-                asset["file/ctime"] = int(asset_file.ctime)
-                asset.save()
-
-                if asset["content_type"] in (
-                    ContentType.VIDEO,
-                    ContentType.AUDIO,
-                    ContentType.IMAGE,
-                ):
+                if asset["content_type"] in PROBED_CONTENT_TYPES:
+                    # Metadata is updated by apply_probe_results
+                    # when the probe finishes
                     nebula.log.debug(f"{asset}: probing asset")
-                    result = ffprobe_asset(asset)
-                else:
-                    result = None
-
-                if result:
-                    asset = result
-                elif asset["status"] != ObjectStatus.CREATING:
-                    asset["status"] = ObjectStatus.CREATING
-                    return
-                else:
-                    return
-
-                if asset["status"] == ObjectStatus.RESET:
-                    asset["status"] = ObjectStatus.ONLINE
-                    nebula.log.info(f"{asset}: Metadata reset completed")
+                    self.probe_pool.submit(
+                        ProbeRequest(asset, file_path, id_storage, file_info)
+                    )
                 else:
-                    asset["status"] = ObjectStatus.CREATING
-                asset.save()
+                    self.update_metadata(asset, file_info, None)
+                return
 
         if (
             asset["status"] == ObjectStatus.CREATING
             and asset["mtime"] + 15 > time.time()
         ):
             nebula.log.debug(f"{asset}: Waiting for completion assurance")
-            asset.save(set_mtime=False, notify=False)
+            asset.to_asset().save(set_mtime=False, notify=False)
 
         elif asset["status"] in (ObjectStatus.CREATING, ObjectStatus.OFFLINE):
             nebula.log.success(f"{asset}: Turning online")
+            asset = asset.to_asset()
 
             # Do not restart actions if file just reappeared
             restart_actions = asset["status"] == ObjectStatus.CREATING
@@ -0,0 +1,54 @@
+import os
+from collections import OrderedDict
+
+# Number of directory listings kept. Assets are scanned ordered by path,
+# so only a few directories are in use at once.
+DEFAULT_DIR_CACHE_SIZE = 64
+
+
+class DirectoryCache:
+    """Stat files using one os.scandir call per directory.
+
+    The first lookup in a directory lists it, the following lookups
+    in the same directory are served from memory. Only the looked up
+    files are stat'ed, so large directories with few assets are cheap.
+    On network storages this replaces several round trips per file with
+    a directory read (NFS clients fetch the attributes with the listing).
+
+    The listings are not refreshed, so a new cache should be used for
+    each scan.
+    """
+
+    def __init__(self, size: int = DEFAULT_DIR_CACHE_SIZE) -> None:
+        self.size = size
+        self.listings: OrderedDict[str, dict[str, os.DirEntry]] = OrderedDict()
+
+    def stat(self, path: str) -> os.stat_result | None:
+        """Return the stat result of a regular file or None if it doesn't exist"""
+        directory, name = os.path.split(path)
+        listing = self.listings.get(directory)
+        if listing is None:
+            listing = self._scan(directory)
+            self.listings[directory] = listing
+            if len(self.listings) > self.size:
+                self.listings.popitem(last=False)
+        else:
+            self.listings.move_to_end(directory)
+        entry = listing.get(name)
+        if entry is None:
+            return None
+        try:
+            if entry.is_file():
+                # DirEntry caches the result
+                return entry.stat()
+        except OSError:
+            # broken symlink or the file has just been removed
+            pass
+        return None
+
+    def _scan(self, directory: str) -> dict[str, os.DirEntry]:
+        try:
+            with os.scandir(directory) as entries:
+                return {entry.name: entry for entry in entries}
+        except OSError:
+            return {}
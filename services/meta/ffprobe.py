@@ -1,4 +1,5 @@
 import difflib
+from typing import Any
 
 from nxtools import get_base_name, slugify
 
@@ -38,7 +39,11 @@ def ffprobe_asset(asset: Asset):
     meta = mediaprobe(asset.file_path)
     if not meta:
         return False
+    return apply_probe_result(asset, meta)
 
+
+def apply_probe_result(asset: Asset, meta: dict[str, Any]) -> Asset:
+    """Update asset metadata using the result of mediaprobe"""
     for key, value in meta.items():
         metatype = settings.metatypes.get(key)
         if not metatype:
@@ -0,0 +1,98 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import nebula
+from nebula.mediaprobe import mediaprobe
+from nebula.objects import Asset
+
+DEFAULT_PROBE_WORKERS = 4
+
+
+class ProbeRequest:
+    def __init__(
+        self,
+        asset: Asset,
+        path: str,
+        id_storage: int,
+        file_info: dict[str, int],
+    ) -> None:
+        self.asset = asset
+        self.path = path
+        self.id_storage = id_storage
+        # file/size, file/mtime, file/ctime as seen by the scan
+        self.file_info = file_info
+
+
+class ProbePool:
+    """Run mediaprobe for multiple files in parallel.
+
+    At most `workers` files are probed at once, and at most `per_storage`
+    files from one storage (0 means no per-storage limit), so a slow
+    storage can't occupy all the workers. Requests over the limits are
+    queued.
+
+    Only mediaprobe runs in the worker threads. The service collects
+    the results using completed() and applies them in its main thread.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PROBE_WORKERS, per_storage: int = 0):
+        self.workers = max(1, workers)
+        self.per_storage = per_storage
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="probe",
+        )
+        self.queue: deque[ProbeRequest] = deque()
+        self.running: dict[Future, ProbeRequest] = {}
+        self.by_storage: Counter[int] = Counter()
+        self.asset_ids: set[int] = set()
+
+    def __contains__(self, id: int) -> bool:
+        """Return True if the asset with the given ID is queued or being probed"""
+        return id in self.asset_ids
+
+    def __len__(self) -> int:
+        return len(self.asset_ids)
+
+    def submit(self, request: ProbeRequest) -> None:
+        assert request.asset.id, "Unable to probe an unsaved asset"
+        self.asset_ids.add(request.asset.id)
+        self.queue.append(request)
+        self._start_queued()
+
+    def _start_queued(self) -> None:
+        waiting: deque[ProbeRequest] = deque()
+        while self.queue and len(self.running) < self.workers:
+            request = self.queue.popleft()
+            if self.per_storage and (
+                self.by_storage[request.id_storage] >= self.per_storage
+            ):
+                waiting.append(request)
+                continue
+            self.by_storage[request.id_storage] += 1
+            future = self.executor.submit(mediaprobe, request.path)
+            self.running[future] = request
+        waiting.extend(self.queue)
+        self.queue = waiting
+
+    def completed(self) -> list[tuple[ProbeRequest, dict[str, Any] | None]]:
+        """Return finished requests and their results without blocking"""
+        result: list[tuple[ProbeRequest, dict[str, Any] | None]] = []
+        for future in [f for f in self.running if f.done()]:
+            request = self.running.pop(future)
+            self.by_storage[request.id_storage] -= 1
+            self.asset_ids.discard(request.asset.id)  # type: ignore
+            try:
+                meta = future.result()
+            except Exception:
+                nebula.log.traceback(f"Unable to probe {request.path}")
+                meta = None
+            result.append((request, meta))
+        if result:
+            self._start_queued()
+        return result
+
+    def shutdown(self) -> None:
+        self.queue.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
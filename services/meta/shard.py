@@ -0,0 +1,144 @@
+"""Split the meta service work between multiple instances.
+
+Each meta service scans the assets of its shard, which is configured
+using attributes of the service settings:
+
+    storages="1,3"  scan only files on these storages (default: all)
+    shard="0/4"     scan only assets whose id % 4 == 0 (default: all)
+
+For example, two instances with shard="0/2" and shard="1/2" split all
+assets between them, and an instance with storages="5" can scan a
+slow storage on the host it is mounted on.
+"""
+
+import math
+from typing import Any
+from xml.etree.ElementTree import Element
+
+from nxtools import xml
+
+import nebula
+from nebula.db import DB
+from nebula.settings import settings
+
+# Coverage of hash partitions is checked only up to this many residues
+MAX_COVERAGE_CHECK = 1024
+
+
+class MetaShard:
+    def __init__(
+        self,
+        storages: set[int] | None = None,
+        index: int = 0,
+        count: int = 1,
+    ) -> None:
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.storages = storages
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def from_settings(cls, service_settings: Element | None) -> "MetaShard":
+        """Create a shard from meta service settings.
+
+        Raises ValueError if the settings are invalid.
+        """
+        if service_settings is None:
+            return cls()
+        storages: set[int] | None = None
+        if value := service_settings.attrib.get("storages", "").strip():
+            storages = {int(id.strip()) for id in value.split(",") if id.strip()}
+        index, count = 0, 1
+        if value := service_settings.attrib.get("shard", "").strip():
+            index_str, _, count_str = value.partition("/")
+            index, count = int(index_str), int(count_str)
+        return cls(storages, index, count)
+
+    def __str__(self) -> str:
+        storages = ",".join(str(s) for s in sorted(self.storages or [])) or "all"
+        return f"shard {self.index}/{self.count} of storages {storages}"
+
+    @property
+    def is_full(self) -> bool:
+        return self.storages is None and self.count == 1
+
+    def covers_storage(self, id_storage: int) -> bool:
+        return self.storages is None or id_storage in self.storages
+
+    def sql_conditions(self) -> tuple[str, list[Any]]:
+        """Return an SQL condition (starting with AND) and its arguments"""
+        conds = ""
+        args: list[Any] = []
+        if self.storages is not None:
+            conds += " AND meta->>'id_storage' = ANY(%s)"
+            args.append([str(id) for id in self.storages])
+        if self.count > 1:
+            conds += " AND id %% %s = %s"
+            args.extend([self.count, self.index])
+        return conds, args
+
+
+#
+# Coverage check
+#
+
+
+def load_meta_shards(db: DB) -> dict[int, MetaShard]:
+    """Return shards of all enabled meta services by service ID"""
+    db.query(
+        """
+        SELECT id, title, settings FROM services
+        WHERE service_type = 'meta' AND autostart = true
+        """
+    )
+    result: dict[int, MetaShard] = {}
+    for id_service, title, service_settings in db.fetchall():
+        try:
+            result[id_service] = MetaShard.from_settings(
+                xml(service_settings) if service_settings else None
+            )
+        except Exception:
+            nebula.log.warning(f"Unable to parse shard of meta service {title}")
+    return result
+
+
+def _uncovered_residues(shards: list[MetaShard]) -> list[int] | None:
+    """Return residues (mod lcm of shard counts) not covered by any shard.
+
+    Returns None if there are too many residues to check.
+    """
+    if any(shard.count == 1 for shard in shards):
+        return []
+    modulus = math.lcm(*(shard.count for shard in shards))
+    if modulus > MAX_COVERAGE_CHECK:
+        return None
+    return [
+        residue
+        for residue in range(modulus)
+        if not any(residue % shard.count == shard.index for shard in shards)
+    ]
+
+
+def check_shard_coverage(shards: list[MetaShard]) -> bool:
+    """Warn if files on some storage are not scanned by any meta service"""
+    result = True
+    for storage in settings.storages:
+        covering = [shard for shard in shards if shard.covers_storage(storage.id)]
+        if not covering:
+            nebula.log.warning(f"Storage {storage.id} has no meta service assigned")
+            result = False
+            continue
+        uncovered = _uncovered_residues(covering)
+        if uncovered is None:
+            nebula.log.warning(
+                f"Unable to check shard coverage of storage {storage.id}"
+            )
+        elif uncovered:
+            modulus = math.lcm(*(shard.count for shard in covering))
+            nebula.log.warning(
+                f"Assets on storage {storage.id} with id % {modulus} in "
+                f"{uncovered} have no meta service assigned"
+            )
+            result = False
+    return result
@@ -8,6 +8,7 @@ from nebula.base_service import BaseService
 from nebula.db import DB
 from nebula.enum import ObjectStatus, RunMode
 from nebula.helpers import get_item_event, get_next_item
+from nebula.objects.base import object_cache
 from services.play.plugins import PlayoutPlugins
 from services.play.request_handler import PlayoutRequestHandler
 
@@ -67,6 +68,12 @@ class Service(BaseService):
 
         self.status_key = f"playout_status/{self.channel.id}"
 
+        # Items and assets are loaded repeatedly while cueing,
+        # so keep them in memory unless disabled in service settings.
+        if not object_cache.enabled:
+            cache_size = int(self.settings.attrib.get("object_cache_size", 1000))
+            object_cache.enable(cache_size)
+
         self.plugins = PlayoutPlugins(self)
         self.controller = create_controller(self)
         if not self.controller:
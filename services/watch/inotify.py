@@ -0,0 +1,126 @@
+"""Minimal inotify binding.
+
+Only the calls needed by the watch service are bound (using ctypes,
+so no extra dependency is needed). Available on Linux only.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Events needed to track files in a drop folder
+WATCH_MASK = (
+    IN_CREATE
+    | IN_CLOSE_WRITE
+    | IN_MOVED_TO
+    | IN_MOVED_FROM
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 65536
+
+
+class Inotify:
+    """inotify instance with a non-blocking event reader.
+
+    Raises OSError when inotify is not available
+    or the watch limit is reached.
+    """
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("Unable to find libc")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        try:
+            self._init = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+        except AttributeError as e:
+            raise OSError("inotify is not supported") from e
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        fd = self._init(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd: int = fd
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Unable to watch {path}: {os.strerror(errno)}")
+        self.watches[wd] = path
+        return wd
+
+    def remove_watches(self, path: str) -> None:
+        """Stop watching a directory and its subdirectories"""
+        prefix = os.path.join(path, "")
+        for wd, watched_path in list(self.watches.items()):
+            if watched_path == path or watched_path.startswith(prefix):
+                # fails if the watch was already removed by the kernel
+                self._rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read_events(self) -> list[tuple[str, int]]:
+        """Return pending events as (path, mask) tuples without blocking.
+
+        The path is the path of the watched directory joined
+        with the name of the file the event relates to.
+        """
+        events: list[tuple[str, int]] = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append(("", mask))
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self.watches[wd]
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                events.append((path, mask))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches = {}
@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import Any
+
+from nebula.db import DB
+from nebula.enum import MediaType
+from nebula.log import log
+from nebula.messaging import messaging
+
+# Full reload interval. Catches changes whose messages were lost
+RELOAD_INTERVAL = 3600
+
+PathKey = tuple[int, str]  # (id_storage, path)
+
+
+class AssetPathIndex:
+    """Index of file assets: (id_storage, path) -> asset ID
+
+    The index is loaded once and then updated incrementally:
+    IDs from objects_changed messages are collected by the messaging
+    thread and re-read by refresh(), which is called from the service
+    loop. Assets created by the watch service are added using add().
+
+    The index is reloaded when messages might have been lost (Redis
+    reconnect) and every `reload_interval` seconds.
+    """
+
+    def __init__(self, reload_interval: float = RELOAD_INTERVAL) -> None:
+        self.reload_interval = reload_interval
+        self.by_path: dict[PathKey, int] = {}
+        self.by_id: dict[int, PathKey] = {}
+        self.lock = threading.Lock()
+        self.changed: set[int] = set()
+        self.loaded_at: float = 0
+        messaging.subscribe(
+            "objects_changed",
+            self.on_objects_changed,
+            on_reset=self.invalidate,
+        )
+
+    def __contains__(self, key: PathKey) -> bool:
+        return key in self.by_path
+
+    def __len__(self) -> int:
+        return len(self.by_path)
+
+    def get(self, id_storage: int, path: str) -> int | None:
+        return self.by_path.get((id_storage, path))
+
+    #
+    # Updates
+    #
+
+    def on_objects_changed(self, data: dict[str, Any]) -> None:
+        if data.get("object_type") != "asset":
+            return
+        with self.lock:
+            self.changed.update(int(id) for id in data.get("objects", []) if id)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.loaded_at = 0
+
+    def add(self, id: int, id_storage: int, path: str) -> None:
+        self.remove(id)
+        key = (int(id_storage), path.replace("\\", "/"))
+        self.by_path[key] = id
+        self.by_id[id] = key
+
+    def remove(self, id: int) -> None:
+        if (key := self.by_id.pop(id, None)) is not None:
+            if self.by_path.get(key) == id:
+                del self.by_path[key]
+
+    def refresh(self, db: DB) -> None:
+        """Reload the index or apply collected changes"""
+        with self.lock:
+            reload = time.time() - self.loaded_at > self.reload_interval
+            if reload:
+                # set before loading, so invalidation during the load
+                # triggers another one
+                self.loaded_at = time.time()
+            changed, self.changed = self.changed, set()
+
+        if reload:
+            self.load(db)
+        elif changed:
+            self.update(db, changed)
+
+    def load(self, db: DB) -> None:
+        start_time = time.time()
+        self.by_path = {}
+        self.by_id = {}
+        for id, id_storage, path in db.iterate(
+            """
+            SELECT id, meta->>'id_storage', meta->>'path'
+            FROM assets WHERE media_type = %s
+            """,
+            [MediaType.FILE],
+        ):
+            self._add_row(id, id_storage, path)
+        log.debug(f"Loaded {len(self)} asset paths in {time.time() - start_time:.02f}s")
+
+    def update(self, db: DB, ids: set[int]) -> None:
+        for id in ids:
+            self.remove(id)
+        db.query(
+            """
+            SELECT id, meta->>'id_storage', meta->>'path'
+            FROM assets WHERE media_type = %s AND id = ANY(%s)
+            """,
+            [MediaType.FILE, list(ids)],
+        )
+        for id, id_storage, path in db.fetchall():
+            self._add_row(id, id_storage, path)
+
+    def _add_row(self, id: int, id_storage: str | None, path: str | None) -> None:
+        if not (id_storage and path):
+            return
+        try:
+            self.add(id, int(id_storage), path)
+        except ValueError:
+            return
@@ -1,6 +1,6 @@
 import os
 import time
-from typing import TYPE_CHECKING, Generator
+from typing import TYPE_CHECKING, Generator, Literal
 
 from nxtools import FileObject, get_base_name, get_files
 
@@ -9,14 +9,46 @@ from nebula.base_service import BaseService
 from nebula.db import DB
 from nebula.enum import MediaType, ObjectStatus
 from nebula.filetypes import FileTypes
-from nebula.helpers import asset_by_path
-from nebula.objects import Asset
+from nebula.objects import Asset, save_many
+
+from .inotify import (
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_ISDIR,
+    IN_MOVE_SELF,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_Q_OVERFLOW,
+    Inotify,
+)
+from .path_index import AssetPathIndex
 
 if TYPE_CHECKING:
     from xml.etree.ElementTree import Element
 
+# New assets are saved in batches of this size
+SAVE_BATCH_SIZE = 100
+
+# Full rescan interval of watchfolders in the inotify mode
+DEFAULT_RESCAN_INTERVAL = 600
+
+# Seconds after which files whose post-script failed are checked again
+# in the inotify mode (in the poll mode, they are checked on every scan)
+POST_SCRIPT_RETRY_DELAY = 60
+
 
 class Watchfolder:
+    """Watch folder configured by a <folder> element.
+
+    In the default "poll" mode, the whole folder is scanned on every
+    loop. In the "inotify" mode (local storages on Linux), the folder
+    is scanned once and then only files reported by inotify events
+    are checked. A full rescan is performed every `rescan_interval`
+    seconds as a safety net (and whenever events may have been lost).
+    If inotify is not available, the folder falls back to polling.
+    """
+
     id_storage: int
     rel_path: str
     quarantine_time: int
@@ -24,8 +56,11 @@ class Watchfolder:
     recursive: bool
     hidden: bool
     case_sensitive_exts: bool
+    mode: Literal["poll", "inotify"]
+    rescan_interval: int
 
     def __init__(self, settings: "Element"):
+        self.settings = settings
         self.id_storage = int(settings.attrib["id_storage"])
         self.rel_path = settings.attrib["path"]
         self.quarantine_time = int(settings.attrib.get("quarantine_time", "10"))
@@ -35,6 +70,19 @@ class Watchfolder:
         self.case_sensitive_exts = bool(
             settings.attrib.get("case_sensitive_exts", False)
         )
+        mode = settings.attrib.get("mode", "poll").lower()
+        if mode not in ("poll", "inotify"):
+            nebula.log.error(f"Unknown watchfolder mode {mode}. Using poll")
+            mode = "poll"
+        self.mode = mode  # type: ignore
+        self.rescan_interval = int(
+            settings.attrib.get("rescan_interval", DEFAULT_RESCAN_INTERVAL)
+        )
+
+        self.inotify: Inotify | None = None
+        self.last_scan: float = 0
+        # path: time of the last event. Files wait here for the quarantine
+        self.pending: dict[str, float] = {}
 
     @property
     def storage_path(self):
@@ -48,6 +96,22 @@ class Watchfolder:
         return os.path.isdir(self.path)
 
     def get_files(self) -> Generator[FileObject, None, None]:
+        if self.mode == "poll":
+            yield from self.scan()
+            return
+
+        if self.inotify is None or time.time() - self.last_scan > self.rescan_interval:
+            # Watches are set up before scanning,
+            # so files created during the scan are not missed
+            self.start_inotify()
+            self.last_scan = time.time()
+            yield from self.scan()
+            return
+
+        self.read_events()
+        yield from self.get_pending_files()
+
+    def scan(self) -> Generator[FileObject, None, None]:
         for file_object in get_files(
             self.path,
             recursive=self.recursive,
@@ -62,6 +126,123 @@ class Watchfolder:
                 and time.time() - file_object.mtime < self.quarantine_time
             ):
                 nebula.log.trace(f"{file_object.base_name} is too young. Skipping")
+                if self.inotify is not None:
+                    self.pending[file_object.path] = file_object.mtime
+                continue
+
+            yield file_object
+
+    #
+    # inotify
+    #
+
+    def start_inotify(self) -> None:
+        self.stop_inotify()
+        if not self:
+            return
+        try:
+            self.inotify = Inotify()
+            self.watch_tree(self.path)
+        except OSError as e:
+            nebula.log.warning(
+                f"Unable to use inotify for {self.path} ({e}). Using poll mode"
+            )
+            self.stop_inotify()
+            self.mode = "poll"
+
+    def stop_inotify(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        self.pending = {}
+
+    def watch_tree(self, path: str) -> None:
+        assert self.inotify is not None
+        self.inotify.add_watch(path)
+        if not self.recursive:
+            return
+        for root, dirs, _ in os.walk(path):
+            if not self.hidden:
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for dir_name in dirs:
+                self.inotify.add_watch(os.path.join(root, dir_name))
+
+    def read_events(self) -> None:
+        assert self.inotify is not None
+        now = time.time()
+        for path, mask in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost. Rescan
+                self.last_scan = 0
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self.update_subtree(path)
+                continue
+
+            if not self.hidden and os.path.basename(path).startswith("."):
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.pending.pop(path, None)
+            elif mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # A directory moved here may already contain files
+                    try:
+                        self.watch_tree(path)
+                    except OSError as e:
+                        nebula.log.warning(f"{e}. Rescanning {self.path}")
+                        self.last_scan = 0
+                        continue
+                    for file_object in get_files(
+                        path, recursive=True, hidden=self.hidden
+                    ):
+                        self.pending[file_object.path] = now
+            else:
+                self.pending[path] = now
+
+    def update_subtree(self, path: str) -> None:
+        """Update watches of a directory which was moved or deleted"""
+        assert self.inotify is not None
+        if path == self.path:
+            # The watchfolder itself. Start over
+            self.last_scan = 0
+            return
+        if os.path.isdir(path):
+            # Moved within the watchfolder: IN_MOVED_TO has been handled
+            # and the watches point to the new location already
+            return
+        self.inotify.remove_watches(path)
+        prefix = os.path.join(path, "")
+        for pending_path in list(self.pending):
+            if pending_path.startswith(prefix):
+                del self.pending[pending_path]
+
+    def retry_later(self, path: str) -> None:
+        """Check the file again after POST_SCRIPT_RETRY_DELAY"""
+        if self.inotify is not None:
+            # pending holds the time of the last event. A time in the future
+            # keeps the file waiting for the delay plus the quarantine time
+            self.pending[path] = time.time() + POST_SCRIPT_RETRY_DELAY
+
+    def get_pending_files(self) -> Generator[FileObject, None, None]:
+        now = time.time()
+        for path, event_time in list(self.pending.items()):
+            if now - event_time < self.quarantine_time:
+                continue
+            del self.pending[path]
+
+            file_object = FileObject(path)
+            try:
+                if not (file_object.is_reg and file_object.size):
+                    continue
+                mtime = file_object.mtime
+            except OSError:
+                continue
+
+            if self.quarantine_time and now - mtime < self.quarantine_time:
+                # Changed without an event (e.g. still being written)
+                self.pending[path] = mtime
                 continue
 
             yield file_object
@@ -69,42 +250,36 @@ class Watchfolder:
 
 class Service(BaseService):
     def on_init(self):
-        pass
+        self.path_index = AssetPathIndex()
+        # Watchfolders keep their state (inotify watches, pending files)
+        self.watchfolders = [
+            Watchfolder(wf_settings) for wf_settings in self.settings.findall("folder")
+        ]
 
     def on_main(self):
         db = DB()
-        self.existing = []
-        db.query("SELECT meta FROM assets WHERE media_type=1 AND status=1")
-        for (meta,) in db.fetchall():
-            asset = Asset(meta=meta, db=db)
-            file_path = asset.file_path
-            self.existing.append(file_path)
-
-        for wf_settings in self.settings.findall("folder"):
-            watchfolder = Watchfolder(wf_settings)
+        self.path_index.refresh(db)
 
+        for watchfolder in self.watchfolders:
+            wf_settings = watchfolder.settings
             if not watchfolder:
                 nebula.log.warning(f"Watchfolder {watchfolder.path} does not exist")
 
+            new_assets: list[Asset] = []
             i = 0
             for file_object in watchfolder.get_files():
                 i += 1
 
                 full_path = file_object.path
-                if full_path in self.existing:
-                    continue
-
-                now = time.time()
                 asset_path = full_path.replace(watchfolder.storage_path, "", 1).lstrip(
                     "/"
                 )
-                ext = os.path.splitext(asset_path)[1].lstrip(".").lower()
-                if ext not in FileTypes.exts():
+                if (watchfolder.id_storage, asset_path) in self.path_index:
                     continue
 
-                asset = asset_by_path(watchfolder.id_storage, asset_path, db=db)  # type: ignore
-                if asset:
-                    self.existing.append(full_path)
+                now = time.time()
+                ext = os.path.splitext(asset_path)[1].lstrip(".").lower()
+                if ext not in FileTypes.exts():
                     continue
 
                 base_name = get_base_name(asset_path)
@@ -132,5 +307,20 @@ class Service(BaseService):
                         nebula.log.traceback(f"Error executing post-script on {asset}")
                         failed = True
 
-                if not failed:
-                    asset.save(set_mtime=False)
+                if failed:
+                    watchfolder.retry_later(full_path)
+                else:
+                    new_assets.append(asset)
+                    if len(new_assets) >= SAVE_BATCH_SIZE:
+                        self.save_assets(new_assets, db)
+                        new_assets = []
+
+            self.save_assets(new_assets, db)
+
+    def save_assets(self, assets: list[Asset], db: DB) -> None:
+        if not assets:
+            return
+        save_many(assets, db=db, set_mtime=False)
+        for asset in assets:
+            assert asset.id is not None
+            self.path_index.add(asset.id, asset["id_storage"], asset["path"])
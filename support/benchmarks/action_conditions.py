@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Per-evaluation cost of action conditions.
+
+Compares evaluating create_if expressions from their source string
+(the previous behaviour of Action.should_create) with
+Action.should_create, which evaluates cached code objects.
+
+Importing nebula loads the site settings, so run this on a configured
+worker node. Assets are AssetView objects built from generated metadata,
+as scanned by the broker.
+
+Usage: python support/benchmarks/action_conditions.py [assets] [actions]
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+from nxtools import xml
+
+from nebula.jobs import Action
+from nebula.objects import AssetView
+
+CONDITIONS = [
+    "asset['content_type'] == 2 and asset['status'] == 1",
+    "asset['id_folder'] in [1, 2, 3] and not asset['qc/state']",
+    "asset['media_type'] == 1 and asset['duration'] > 60",
+    "asset['id_storage'] == 1 and asset['path'].endswith('.mov')",
+    "asset['video/width'] and asset['video/width'] >= 1920",
+]
+
+
+def make_assets(count: int) -> list[AssetView]:
+    rnd = random.Random(42)
+    return [
+        AssetView(
+            {
+                "id": i,
+                "id_folder": rnd.randint(1, 10),
+                "content_type": rnd.randint(1, 4),
+                "media_type": 1,
+                "status": rnd.choice([0, 1, 1, 1, 2]),
+                "id_storage": rnd.randint(1, 3),
+                "path": f"media/{i:06d}.{rnd.choice(['mov', 'mxf', 'mp4'])}",
+                "duration": rnd.uniform(5, 3600),
+                "video/width": rnd.choice([720, 1280, 1920, 3840]),
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def make_actions(count: int) -> list[Action]:
+    result = []
+    for i in range(count):
+        condition = CONDITIONS[i % len(CONDITIONS)]
+        settings = xml(
+            f"<settings><create_if><![CDATA[{condition}]]></create_if></settings>"
+        )
+        result.append(Action(i + 1, f"bench{i + 1}", settings))
+    return result
+
+
+def bench(
+    label: str,
+    assets: list[AssetView],
+    actions: list[Action],
+    evaluate: Callable[[Action, AssetView], Any],
+) -> None:
+    start = time.perf_counter()
+    for asset in assets:
+        for action in actions:
+            evaluate(action, asset)
+    elapsed = time.perf_counter() - start
+    count = len(assets) * len(actions)
+    print(f"{label:<10} {count} evaluations in {elapsed:.2f} s", end=" ")
+    print(f"({elapsed / count * 1e6:.2f} us per evaluation)")
+
+
+def evaluate_source(action: Action, asset: AssetView) -> Any:
+    assert action.create_if
+    return eval(action.create_if, globals(), {"self": action, "asset": asset})
+
+
+def main() -> None:
+    num_assets = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    num_actions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    assets = make_assets(num_assets)
+    actions = make_actions(num_actions)
+
+    print(f"{num_assets} assets x {num_actions} actions")
+    bench("source", assets, actions, evaluate_source)
+    bench("compiled", assets, actions, Action.should_create)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Cost of parsing ffmpeg stderr.
+
+Replays captured ffmpeg stderr through a pipe and parses it using
+the previous byte-by-byte reader and the chunked reader used by the conv
+service (services/conv/output.py).
+
+Usage: python support/benchmarks/ffmpeg_stderr.py [captured_stderr.txt]
+
+Without an argument, a synthetic log of a two hour encode is generated.
+"""
+
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+OUTPUT_MODULE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "services", "conv", "output.py"
+)
+
+re_position = re.compile(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})\d*", re.U | re.I)
+
+
+def load_output_module():
+    spec = importlib.util.spec_from_file_location("output", OUTPUT_MODULE_PATH)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_stderr(duration: int = 7200, fps: int = 25) -> bytes:
+    lines = [
+        "Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'source.mov':",
+        "  Duration: 02:00:00.00, start: 0.000000, bitrate: 50000 kb/s",
+        "Stream mapping:",
+        "  Stream #0:0 -> #0:0 (prores (native) -> h264 (libx264))",
+        "Press [q] to stop, [?] for help",
+    ]
+    result = "\n".join(lines) + "\n"
+    # ffmpeg prints a status line roughly twice per second
+    for half_second in range(duration * 2):
+        pos = half_second / 2
+        hh, mm, ss = int(pos // 3600), int(pos // 60 % 60), pos % 60
+        result += (
+            f"frame={int(pos * fps):6d} fps=250 q=28.0 size={half_second * 40:8d}kB "
+            f"time={hh:02d}:{mm:02d}:{ss:05.2f} bitrate=5000.0kbits/s speed=10.0x    \r"
+        )
+    return result.encode()
+
+
+def parse_bytewise(stream) -> int:
+    positions = 0
+    buff = b""
+    error_log = ""
+    while True:
+        ch = stream.read(1)
+        if not ch:
+            break
+        if ch in [b"\n", b"\r"]:
+            line = buff.decode("utf-8", errors="ignore").strip()
+            if re_position.search(line):
+                positions += 1
+                error_log = ""
+            else:
+                error_log += line + "\n"
+            buff = b""
+        else:
+            buff += ch
+    return positions
+
+
+def parse_chunked(stream, output) -> int:
+    positions = 0
+    error_log = output.ErrorLog()
+    for line in output.iter_lines(stream):
+        if "time=" in line and re_position.search(line):
+            positions += 1
+            error_log.clear()
+        else:
+            error_log.append(line)
+    return positions
+
+
+def replay(label: str, path: str, parser) -> None:
+    proc = subprocess.Popen(["cat", path], stdout=subprocess.PIPE)
+    assert proc.stdout
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    positions = parser(proc.stdout)
+    cpu = time.process_time() - start_cpu
+    wall = time.perf_counter() - start_wall
+    proc.wait()
+    print(f"{label:<10} {positions} status lines, {wall:.3f} s wall, {cpu:.3f} s CPU")
+
+
+def main() -> None:
+    output = load_output_module()
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+        cleanup = False
+    else:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as f:
+            f.write(synthetic_stderr())
+            path = f.name
+        cleanup = True
+
+    print(f"Replaying {os.path.getsize(path)} bytes of ffmpeg stderr")
+    try:
+        replay("bytewise", path, parse_bytewise)
+        replay("chunked", path, lambda stream: parse_chunked(stream, output))
+    finally:
+        if cleanup:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""Cost of serializing asset metadata.
+
+Serializes and parses a set of realistic asset metadata documents
+(descriptive, file and technical metadata, audio tracks and subclips)
+using the standard library json module and the codec used by nebula
+(nebula/serialization.py, orjson when it is installed).
+
+Usage: python support/benchmarks/json_codec.py [number_of_assets]
+"""
+
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+SERIALIZATION_MODULE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "nebula", "serialization.py"
+)
+
+WORDS = (
+    "news weather sport culture evening morning report interview live studio "
+    "europe election market concert festival documentary series episode"
+).split()
+
+
+def load_serialization_module():
+    spec = importlib.util.spec_from_file_location(
+        "serialization", SERIALIZATION_MODULE_PATH
+    )
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sentence(length: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def asset_meta(id_asset: int) -> dict:
+    now = time.time()
+    duration = random.uniform(10, 7200)
+    return {
+        "id": id_asset,
+        "id_folder": random.randint(1, 12),
+        "id_storage": 1,
+        "media_type": 1,
+        "content_type": 2,
+        "status": 1,
+        "version_of": 0,
+        "ctime": now - random.uniform(0, 10**7),
+        "mtime": now,
+        "title": sentence(4),
+        "subtitle": sentence(6),
+        "description": sentence(80),
+        "genre": "https://eng.ebu.ch/ebu_cs/genre/3.1.1",
+        "path": f"media.dir/{id_asset:06d}.mxf",
+        "duration": duration,
+        "mark_in": 0,
+        "mark_out": duration,
+        "file/size": random.randint(10**6, 10**11),
+        "file/mtime": int(now),
+        "file/ctime": int(now),
+        "file/format": "mxf",
+        "video/width": 1920,
+        "video/height": 1080,
+        "video/fps": "25/1",
+        "video/pixel_format": "yuv422p10le",
+        "video/codec": "prores",
+        "video/aspect_ratio": 1.7777777777777777,
+        "audio/r128/i": -23.1,
+        "audio/r128/lra": 7.4,
+        "audio_tracks": [
+            {
+                "index": i,
+                "channels": 2,
+                "channel_layout": "stereo",
+                "language": "eng",
+                "codec": "pcm_s24le",
+            }
+            for i in range(4)
+        ],
+        "subclips": [
+            {"title": sentence(3), "mark_in": i * 60.0, "mark_out": i * 60.0 + 30}
+            for i in range(random.randint(0, 20))
+        ],
+        "qc/state": 4,
+        "id/main": f"AST{id_asset:08d}",
+    }
+
+
+def measure(label: str, dumps, loads, documents: list[dict]) -> None:
+    start = time.perf_counter()
+    encoded = [dumps(doc) for doc in documents]
+    dumps_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for payload in encoded:
+        loads(payload)
+    loads_time = time.perf_counter() - start
+
+    size = sum(len(payload) for payload in encoded)
+    print(
+        f"{label:<8} dumps {dumps_time:.3f} s, loads {loads_time:.3f} s, "
+        f"{size / len(documents):.0f} bytes per document"
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    serialization = load_serialization_module()
+    random.seed(0)
+    documents = [asset_meta(i) for i in range(1, count + 1)]
+
+    print(f"Serializing {count} asset metadata documents")
+    measure("stdlib", json.dumps, json.loads, documents)
+    if serialization.HAS_ORJSON:
+        measure(
+            "orjson",
+            serialization.json_dumps,
+            serialization.json_loads,
+            documents,
+        )
+    else:
+        print("orjson is not installed")
+
+
+if __name__ == "__main__":
+    main()